@@ -0,0 +1,20 @@
+from auxiliary._lazy import lazy_attributes
+
+# submodules are imported on first access, e.g. `auxiliary.io`, to keep `import auxiliary` fast
+__getattr__, __dir__, __all__ = lazy_attributes(
+    __name__,
+    submodules=[
+        "aio",
+        "batch_conversion",
+        "conversion",
+        "dicom_index",
+        "instrumentation",
+        "io",
+        "loader",
+        "nifti",
+        "normalization",
+        "runscript",
+        "tiff",
+        "turbopath",
+    ],
+)
@@ -0,0 +1,81 @@
+"""
+Deferred imports, so that importing auxiliary does not load SimpleITK, tifffile or loguru before they are used.
+"""
+
+import importlib
+import sys
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class LazyImport:
+    """
+    Stand-in for a module, or an attribute of a module, that is imported on first attribute access.
+
+    Resolved attributes are cached on the instance, so later accesses cost the same as on the module itself.
+    The import itself is thread-safe through Python's import lock.
+
+    Args:
+        module_name (str): Name of the module, e.g. "SimpleITK".
+        attribute (str, optional): Name of an attribute of the module to stand in for, e.g. "logger".
+    """
+
+    def __init__(self, module_name: str, attribute: Optional[str] = None) -> None:
+        self._module_name = module_name
+        self._attribute = attribute
+
+    def _resolve(self):
+        target = importlib.import_module(self._module_name)
+        if self._attribute is not None:
+            target = getattr(target, self._attribute)
+        return target
+
+    def __getattr__(self, name: str):
+        value = getattr(self._resolve(), name)
+        self.__dict__[name] = value
+        return value
+
+    def __dir__(self) -> List[str]:
+        return dir(self._resolve())
+
+    def __repr__(self) -> str:
+        target = self._module_name + (f".{self._attribute}" if self._attribute else "")
+        return f"<lazy import of {target}>"
+
+
+def lazy_attributes(
+    package_name: str,
+    submodules: Iterable[str] = (),
+    attributes: Optional[Dict[str, str]] = None,
+) -> Tuple[Callable, Callable, List[str]]:
+    """
+    Create the module-level `__getattr__`, `__dir__` and `__all__` (PEP 562) of a package
+    whose submodules and re-exported attributes are only imported on first access.
+
+    Args:
+        package_name (str): `__name__` of the package.
+        submodules (Iterable[str]): Names of submodules accessible as attributes, e.g. "io".
+        attributes (Dict[str, str], optional): Re-exported names mapped to the relative submodule defining them,
+            e.g. {"PercentileNormalizer": ".percentile_normalizer"}.
+
+    Returns:
+        Tuple[Callable, Callable, List[str]]: `__getattr__`, `__dir__` and `__all__` of the package.
+    """
+    submodules = set(submodules)
+    attributes = dict(attributes or {})
+    names = sorted(submodules | set(attributes))
+
+    def __getattr__(name: str):
+        if name in submodules:
+            return importlib.import_module(f".{name}", package_name)
+        if name in attributes:
+            module = importlib.import_module(attributes[name], package_name)
+            value = getattr(module, name)
+            # cache on the package so that __getattr__ is not called again
+            setattr(sys.modules[package_name], name, value)
+            return value
+        raise AttributeError(f"module {package_name!r} has no attribute {name!r}")
+
+    def __dir__() -> List[str]:
+        return sorted(set(vars(sys.modules[package_name])) | set(names))
+
+    return __getattr__, __dir__, names
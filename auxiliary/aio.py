@@ -0,0 +1,159 @@
+"""
+Awaitable versions of the blocking I/O and conversion functions of auxiliary.
+
+All calls run on a shared, bounded thread pool; SimpleITK, tifffile and zlib release the GIL,
+so many volumes are decoded and encoded concurrently without blocking the event loop:
+
+    images = await asyncio.gather(*(aio.read_image(path) for path in paths))
+
+At most `max_pending` calls are submitted to the pool at once; further calls wait for a free slot (backpressure).
+Cancelling a call that has not started removes it from the pool. A call that is already running cannot be
+interrupted; it completes in the background and keeps its slot until then.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from auxiliary import conversion, io
+from auxiliary.tiff import io as tiff_io
+
+_lock = threading.Lock()
+_max_workers: Optional[int] = None
+_max_pending: Optional[int] = None
+_executor: Optional[ThreadPoolExecutor] = None
+# one semaphore per event loop, as asyncio primitives are bound to a loop
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def configure(
+    max_workers: Optional[int] = None, max_pending: Optional[int] = None
+) -> None:
+    """
+    Configure the shared executor. Calls already submitted finish on the previous executor.
+
+    Args:
+        max_workers (int, optional): Number of threads running calls concurrently.
+            Defaults to the number of processors plus four, at most 32.
+        max_pending (int, optional): Maximum number of calls submitted to the executor at once, running or queued.
+            Defaults to twice the number of threads.
+    """
+    global _max_workers, _max_pending, _executor
+    with _lock:
+        previous = _executor
+        _max_workers = max_workers
+        _max_pending = max_pending
+        _executor = None
+        _semaphores.clear()
+    if previous is not None:
+        previous.shutdown(wait=False)
+
+
+def shutdown(wait: bool = True) -> None:
+    """
+    Shut down the shared executor. It is recreated on the next call.
+
+    Args:
+        wait (bool): Whether to wait for running calls to finish. Defaults to True.
+    """
+    global _executor
+    with _lock:
+        previous = _executor
+        _executor = None
+    if previous is not None:
+        previous.shutdown(wait=wait, cancel_futures=True)
+
+
+def _resolved_max_workers() -> int:
+    # same default as ThreadPoolExecutor
+    return _max_workers or min(32, (os.cpu_count() or 1) + 4)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_resolved_max_workers(), thread_name_prefix="auxiliary-aio"
+            )
+        return _executor
+
+
+def _get_semaphore(loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+    with _lock:
+        semaphore = _semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(_max_pending or 2 * _resolved_max_workers())
+            _semaphores[loop] = semaphore
+        return semaphore
+
+
+def _release_threadsafe(
+    loop: asyncio.AbstractEventLoop, semaphore: asyncio.Semaphore
+) -> None:
+    try:
+        loop.call_soon_threadsafe(semaphore.release)
+    except RuntimeError:
+        # the event loop has been closed in the meantime
+        pass
+
+
+async def run_in_executor(func: Callable, *args, **kwargs):
+    """
+    Run a blocking function on the shared executor and await its result.
+
+    Args:
+        func (Callable): The function.
+        *args: Positional arguments of the function.
+        **kwargs: Keyword arguments of the function.
+
+    Returns:
+        The return value of the function.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _get_semaphore(loop)
+    await semaphore.acquire()
+    try:
+        future = _get_executor().submit(functools.partial(func, *args, **kwargs))
+    except BaseException:
+        semaphore.release()
+        raise
+    # the slot is freed once the call has finished or was cancelled before it started
+    future.add_done_callback(lambda _: _release_threadsafe(loop, semaphore))
+    # cancelling the awaiting task cancels the call if it has not started yet
+    return await asyncio.wrap_future(future)
+
+
+def _awaitable(func: Callable) -> Callable:
+    """
+    Create an awaitable version of a blocking function that runs on the shared executor.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_in_executor(func, *args, **kwargs)
+
+    wrapper.__doc__ = (
+        f"Awaitable version of `{func.__module__}.{func.__name__}`, run on the shared executor.\n"
+        + (func.__doc__ or "")
+    )
+    return wrapper
+
+
+read_image = _awaitable(io.read_image)
+read_image_info = _awaitable(io.read_image_info)
+read_image_region = _awaitable(io.read_image_region)
+write_image = _awaitable(io.write_image)
+
+read_tiff = _awaitable(tiff_io.read_tiff)
+read_tiff_region = _awaitable(tiff_io.read_tiff_region)
+write_tiff = _awaitable(tiff_io.write_tiff)
+
+dcm2niix = _awaitable(conversion.dcm2niix)
+dicom_to_image_itk = _awaitable(conversion.dicom_to_image_itk)
+dicom_to_nifti_itk = _awaitable(conversion.dicom_to_nifti_itk)
+nifti_to_dicom_itk = _awaitable(conversion.nifti_to_dicom_itk)
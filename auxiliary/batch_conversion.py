@@ -0,0 +1,300 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+from auxiliary._lazy import LazyImport
+from auxiliary.conversion import dcm2niix, dicom_to_nifti_itk
+from auxiliary.dicom_index import DicomSeriesIndex
+
+logger = LazyImport("loguru", "logger")
+
+BACKENDS = ("itk", "dcm2niix")
+
+
+def fingerprint_directory(input_dir: Union[Path, str]) -> str:
+    """
+    Compute a fingerprint of a directory from the names, sizes and modification times of all files in it.
+
+    Args:
+        input_dir (Union[Path, str]): Path to the directory, searched recursively.
+
+    Returns:
+        str: The SHA-1 hex digest of the file listing.
+    """
+    input_dir = Path(input_dir)
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for file_name in sorted(files):
+            file_path = Path(root) / file_name
+            stat = file_path.stat()
+            relative_path = file_path.relative_to(input_dir).as_posix()
+            digest.update(
+                f"{relative_path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode()
+            )
+    return digest.hexdigest()
+
+
+def _load_journal(journal_path: Path) -> Dict[str, dict]:
+    """
+    Load the latest journal record of each input directory.
+    Incomplete trailing lines, e.g. from an interrupted run, are ignored.
+    """
+    records = {}
+    if journal_path.exists():
+        with open(journal_path) as journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record["input"]] = record
+    return records
+
+
+def _study_output_name(input_dir: Path) -> str:
+    """
+    Name of the output subdirectory of a study: the directory name followed by a hash of its absolute path,
+    so that studies with the same name in different locations, e.g. A/study1 and B/study1, do not collide.
+    """
+    path_hash = hashlib.sha1(str(input_dir).encode()).hexdigest()[:8]
+    return f"{input_dir.name}-{path_hash}"
+
+
+def _convert_study(
+    input_dir: Path,
+    output_dir: Path,
+    backend: str,
+    compress: bool,
+    series_index: DicomSeriesIndex,
+) -> List[str]:
+    """
+    Convert a single study directory with the given backend and return the written files.
+    """
+    if backend == "itk":
+        output_paths = []
+        # dicom_to_nifti_itk only reads the series directly in a directory, so every directory of
+        # e.g. a study/series/ layout is converted, mirroring the layout in the output directory
+        for root, dirs, _ in os.walk(input_dir):
+            dirs.sort()
+            series_dir = Path(root)
+            # the headers are parsed once, the conversion looks the series up in the index
+            if not series_index.series(series_dir):
+                continue
+            output_paths.extend(
+                dicom_to_nifti_itk(
+                    series_dir,
+                    output_dir / series_dir.relative_to(input_dir),
+                    series_index=series_index,
+                )
+            )
+        if not output_paths:
+            raise RuntimeError(f"{input_dir} does not contain a valid DICOM series.")
+    else:
+        dcm2niix(input_dir, output_dir, compress=compress)
+        output_paths = sorted(output_dir.glob("*.nii*"))
+    return [str(output_path) for output_path in output_paths]
+
+
+def convert_batch(
+    input_dirs: Union[Path, str, Sequence[Union[Path, str]]],
+    output_dir: Union[Path, str],
+    backend: str = "itk",
+    num_workers: int = 4,
+    journal_path: Optional[Union[Path, str]] = None,
+    compress: bool = True,
+    root: bool = False,
+) -> List[dict]:
+    """
+    Convert many DICOM study directories to NIfTI in parallel, recording every job in a resumable journal.
+
+    Each study is written to its own subdirectory of `output_dir`, named after the study directory and a short hash
+    of its absolute path (e.g. "study1-3f2a9c1b"), so that studies with the same name do not overwrite each other.
+    The journal is a JSON Lines file with one record per finished job, holding the input fingerprint, outputs,
+    duration and status. Studies whose last record succeeded with an unchanged fingerprint are skipped,
+    so interrupted runs resume where they stopped.
+
+    Args:
+        input_dirs (Union[Path, str, Sequence[Union[Path, str]]]): A study directory or a list of them, or root
+            directories whose subdirectories are the studies if `root` is True.
+        output_dir (Union[Path, str]): Path to the output root directory.
+        backend (str, optional): Conversion backend, "itk" (`dicom_to_nifti_itk`) or "dcm2niix". Both search a study
+            directory recursively; the "itk" backend writes the series of each subdirectory, e.g. of a study/series/
+            layout, to the same relative subdirectory of the study's output folder. Defaults to "itk".
+        num_workers (int, optional): Number of studies converted concurrently. Defaults to 4.
+        journal_path (Optional[Union[Path, str]], optional): Path of the journal. Defaults to `output_dir/journal.jsonl`.
+            The `DicomSeriesIndex` of the "itk" backend is stored next to it, e.g. in `journal.series_index.json`.
+        compress (bool, optional): Whether dcm2niix gz compresses its outputs. Defaults to True.
+        root (bool, optional): If True, `input_dirs` are root directories and each of their subdirectories is
+            converted as a study. Defaults to False.
+
+    Raises:
+        ValueError: If the backend is unknown or no study directory is found.
+
+    Returns:
+        List[dict]: The journal records of the jobs run in this call.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}.")
+
+    if isinstance(input_dirs, (str, Path)):
+        input_dirs = [input_dirs]
+    if root:
+        input_dirs = [
+            path
+            for root_dir in input_dirs
+            for path in sorted(Path(root_dir).iterdir())
+            if path.is_dir()
+        ]
+    input_dirs = [Path(input_dir).absolute() for input_dir in input_dirs]
+    if not input_dirs:
+        raise ValueError("No study directories found.")
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    journal_path = (
+        Path(journal_path) if journal_path is not None else output_dir / "journal.jsonl"
+    )
+    previous_records = _load_journal(journal_path)
+
+    def _run_job(input_dir: Path, fingerprint: str) -> dict:
+        start_time = time.time()
+        record = {
+            "input": str(input_dir),
+            "fingerprint": fingerprint,
+            "backend": backend,
+        }
+        try:
+            outputs = _convert_study(
+                input_dir,
+                output_dir / _study_output_name(input_dir),
+                backend,
+                compress,
+                series_index,
+            )
+            record.update(status="success", outputs=outputs, error=None)
+        except Exception as e:
+            logger.error(f"Failed to convert {input_dir}: {e}")
+            record.update(status="failed", outputs=[], error=str(e))
+        record.update(
+            duration=time.time() - start_time,
+            finished=datetime.datetime.now().isoformat(),
+        )
+        return record
+
+    records = []
+    # at most this many studies are queued or running, so an interrupt only has to cancel a few of them
+    max_pending = 2 * max(num_workers, 1)
+    executor = ThreadPoolExecutor(max_workers=num_workers)
+    pending = set()
+    # shared by all studies and kept next to the journal, so resumed runs do not parse unchanged headers again
+    with open(journal_path, "a") as journal_file, DicomSeriesIndex(
+        journal_path.with_name(journal_path.stem + ".series_index.json")
+    ) as series_index:
+
+        def _journal(done) -> None:
+            for future in done:
+                record = future.result()
+                # flush every record so that an interrupted run can be resumed
+                journal_file.write(json.dumps(record) + "\n")
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+                records.append(record)
+
+        try:
+            for input_dir in input_dirs:
+                fingerprint = fingerprint_directory(input_dir)
+                previous = previous_records.get(str(input_dir))
+                if (
+                    previous is not None
+                    and previous["status"] == "success"
+                    and previous["fingerprint"] == fingerprint
+                    and previous["backend"] == backend
+                ):
+                    logger.info(f"Skipping unchanged {input_dir}")
+                    continue
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    _journal(done)
+                pending.add(executor.submit(_run_job, input_dir, fingerprint))
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _journal(done)
+        except BaseException:
+            # e.g. KeyboardInterrupt: drop the queued studies and journal the running ones once they finish
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            _journal(future for future in pending if not future.cancelled())
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
+    failed = sum(record["status"] != "success" for record in records)
+    logger.info(
+        f"Converted {len(records) - failed} studies, {failed} failed, {len(input_dirs) - len(records)} skipped."
+    )
+    return records
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """
+    Command line entry point of `convert_batch`.
+
+    Args:
+        argv (Optional[Sequence[str]], optional): Command line arguments. Defaults to `sys.argv[1:]`.
+
+    Returns:
+        int: The exit code, 1 if no study was found or any conversion failed and 0 otherwise.
+    """
+    parser = argparse.ArgumentParser(
+        description="Convert DICOM study directories to NIfTI with a resumable journal."
+    )
+    parser.add_argument(
+        "input_dirs",
+        nargs="+",
+        help="Study directories, or root directories whose subdirectories are the studies with --root.",
+    )
+    parser.add_argument(
+        "--root",
+        action="store_true",
+        help="Convert the subdirectories of the input directories as studies.",
+    )
+    parser.add_argument(
+        "-o", "--output-dir", required=True, help="Output root directory."
+    )
+    parser.add_argument("-b", "--backend", choices=BACKENDS, default="itk")
+    parser.add_argument("-j", "--num-workers", type=int, default=4)
+    parser.add_argument("--journal", default=None, help="Path of the journal file.")
+    parser.add_argument(
+        "--no-compress",
+        action="store_true",
+        help="Do not gz compress dcm2niix outputs.",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        records = convert_batch(
+            args.input_dirs,
+            args.output_dir,
+            backend=args.backend,
+            num_workers=args.num_workers,
+            journal_path=args.journal,
+            compress=not args.no_compress,
+            root=args.root,
+        )
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    return int(any(record["status"] != "success" for record in records))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,14 +1,26 @@
+from __future__ import annotations
+
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
-import SimpleITK as sitk
-from loguru import logger
 from numpy.typing import NDArray
 
+from auxiliary._lazy import LazyImport
+from auxiliary.dicom_index import DicomSeriesIndex
+from auxiliary.instrumentation import instrument
+from auxiliary.io import ImageInfo, get_image_info, image_to_array
+
+# heavy backends are only imported on first use
+sitk = LazyImport("SimpleITK")
+logger = LazyImport("loguru", "logger")
 
+
+@instrument(read_path="input_dir", write_path="output_dir")
 def dcm2niix(
     input_dir: Union[Path, str],
     output_dir: Union[Path, str],
@@ -61,20 +73,140 @@ def dcm2niix(
         ) from e
 
 
+def _find_dicom_series(
+    input_dir: Path,
+    series_index: Optional[DicomSeriesIndex] = None,
+) -> Dict[str, List[str]]:
+    """
+    Find the DICOM series in a directory, using a series index if given and GDCM otherwise.
+
+    Args:
+        input_dir (Path): Path to the DICOM directory.
+        series_index (Optional[DicomSeriesIndex], optional): Index to look the series up in. Defaults to None.
+
+    Returns:
+        Dict[str, List[str]]: Series IDs mapped to the sorted file names of the series.
+    """
+    if series_index is not None:
+        return series_index.series(input_dir)
+    return {
+        series_id: sitk.ImageSeriesReader.GetGDCMSeriesFileNames(
+            str(input_dir), series_id
+        )
+        for series_id in sitk.ImageSeriesReader.GetGDCMSeriesIDs(str(input_dir))
+    }
+
+
+def _convert_dicom_series(
+    series_file_names: List[str],
+    output_path: Path,
+) -> Path:
+    """
+    Read a single DICOM series with SimpleITK and write it to the given output path.
+
+    Args:
+        series_file_names (List[str]): The sorted file names of the DICOM series to convert.
+        output_path (Path): Path of the output NIfTI file.
+
+    Returns:
+        Path: The path of the written NIfTI file.
+    """
+    image_dicom = _read_dicom_series(series_file_names)
+
+    sitk.WriteImage(
+        image_dicom,
+        output_path,
+    )
+    return output_path
+
+
+def _read_dicom_series(series_file_names: List[str]) -> sitk.Image:
+    """
+    Read a single DICOM series with SimpleITK.
+
+    Args:
+        series_file_names (List[str]): The sorted file names of the DICOM series.
+
+    Returns:
+        sitk.Image: The image of the series.
+    """
+    series_reader = sitk.ImageSeriesReader()
+    series_reader.SetFileNames(series_file_names)
+    series_reader.MetaDataDictionaryArrayUpdateOn()
+    series_reader.LoadPrivateTagsOn()
+    return series_reader.Execute()
+
+
+@instrument(read_path="input_dir")
+def dicom_to_image_itk(
+    input_dir: Union[Path, str],
+    as_array: bool = False,
+    num_workers: int = 1,
+    series_index: Optional[DicomSeriesIndex] = None,
+) -> Dict[str, Union[sitk.Image, Tuple[NDArray, ImageInfo]]]:
+    """
+    Convert the DICOM series in a directory to in-memory volumes using SimpleITK, without writing files.
+    This is the in-memory counterpart of `dicom_to_nifti_itk`; write the results with e.g. `sitk.WriteImage` if needed.
+
+    Args:
+        input_dir (Union[Path, str]): Path to the input DICOM directory.
+        as_array (bool, optional): If True, return each series as a NumPy array (a zero-copy view of the decoded image)
+            together with its geometry instead of a SimpleITK image. Defaults to False.
+        num_workers (int, optional): Number of series that are read concurrently. Defaults to 1 (sequential).
+        series_index (Optional[DicomSeriesIndex], optional): Index used to look up the series instead of scanning the
+            directory with GDCM. Defaults to None.
+
+    Raises:
+        RuntimeError: If the input directory is not valid or does not contain a DICOM series.
+
+    Returns:
+        Dict[str, Union[sitk.Image, Tuple[NDArray, ImageInfo]]]: Series IDs mapped to the SimpleITK image,
+            or to a tuple of the array and its ImageInfo if `as_array` is True.
+    """
+    input_dir = Path(input_dir)
+
+    if not input_dir.exists() or not input_dir.is_dir():
+        raise RuntimeError(f"{input_dir} is not a valid directory.")
+
+    series = _find_dicom_series(input_dir, series_index)
+    if not series:
+        raise RuntimeError(f"{input_dir} does not contain a valid DICOM series.")
+
+    with ThreadPoolExecutor(max_workers=max(num_workers, 1)) as executor:
+        images = dict(zip(series, executor.map(_read_dicom_series, series.values())))
+
+    if as_array:
+        return {
+            series_id: (image_to_array(image, zero_copy=True), get_image_info(image))
+            for series_id, image in images.items()
+        }
+    return images
+
+
+@instrument(read_path="input_dir", write_path="output_dir")
 def dicom_to_nifti_itk(
     input_dir: Union[Path, str],
     output_dir: Union[Path, str],
     file_name: Optional[str] = None,
-) -> None:
+    num_workers: int = 1,
+    series_index: Optional[DicomSeriesIndex] = None,
+) -> List[Path]:
     """
     Convert a DICOM series to NIfTI format using SimpleITK.
     Args:
         input_dir (Union[Path, str]): Path to the input DICOM directory.
         output_dir (Union[Path, str]): Path to the output NIfTI directory.
         file_name (Optional[str], optional): Name of the output NIfTI file if there is only one DICOM series to be converted. Defaults to None.
+        num_workers (int, optional): Number of series that are read, converted and written concurrently.
+            This also caps the number of series held in memory at the same time. Defaults to 1 (sequential).
+        series_index (Optional[DicomSeriesIndex], optional): Index used to look up the series instead of scanning the
+            directory with GDCM. Defaults to None.
 
     Raises:
         RuntimeError: If the input directory is not valid or does not contain a DICOM series.
+
+    Returns:
+        List[Path]: Paths of the written NIfTI files, in the order of the series IDs.
     """
 
     # Ensure Path objects
@@ -87,23 +219,16 @@ def dicom_to_nifti_itk(
     # create the folder output_dir
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    series_IDs = sitk.ImageSeriesReader.GetGDCMSeriesIDs(str(input_dir))
+    series = _find_dicom_series(input_dir, series_index)
+    series_IDs = list(series)
     if not series_IDs:
         raise RuntimeError(f"{input_dir} does not contain a valid DICOM series.")
 
     if len(series_IDs) > 1:
         logger.warning(f"More than 1 DICOM series was found in the folder: {input_dir}")
 
+    output_paths = []
     for series_id in series_IDs:
-        series_file_names = sitk.ImageSeriesReader.GetGDCMSeriesFileNames(
-            input_dir, series_id
-        )
-        series_reader = sitk.ImageSeriesReader()
-        series_reader.SetFileNames(series_file_names)
-        series_reader.MetaDataDictionaryArrayUpdateOn()
-        series_reader.LoadPrivateTagsOn()
-        image_dicom = series_reader.Execute()
-
         output_path = output_dir / f"{series_id}.nii.gz"
 
         if file_name:
@@ -113,28 +238,116 @@ def dicom_to_nifti_itk(
                 )
             else:
                 output_path = output_dir / file_name
+        output_paths.append(output_path)
+
+    if num_workers <= 1 or len(series_IDs) == 1:
+        return [
+            _convert_dicom_series(series[series_id], output_path)
+            for series_id, output_path in zip(series_IDs, output_paths)
+        ]
 
-        sitk.WriteImage(
-            image_dicom,
-            output_path,
+    # SimpleITK releases the GIL during reading and writing, so threads suffice.
+    # The pool size bounds the number of series that are in flight at once.
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        return list(
+            executor.map(
+                _convert_dicom_series,
+                [series[series_id] for series_id in series_IDs],
+                output_paths,
+            )
         )
 
 
+_REFERENCE_TAGS_TO_COPY = [
+    # "0010|0010",  # Patient Name
+    "0010|0020",  # Patient ID
+    "0010|0030",  # Patient Birth Date
+    "0020|000D",  # Study Instance UID, for machine consumption
+    "0020|0010",  # Study ID, for human consumption
+    "0008|0020",  # Study Date
+    "0008|0030",  # Study Time
+    "0008|0050",  # Accession Number
+    "0008|0060",  # Modality
+]
+
+# Storage classes of multi-frame volumes by modality, GDCM writes no others
+_MULTI_FRAME_SOP_CLASS_UIDS = {
+    "CT": "1.2.840.10008.5.1.4.1.1.2",
+    "MR": "1.2.840.10008.5.1.4.1.1.4",
+}
+
+
+@lru_cache(maxsize=128)
+def _read_reference_tags(
+    reference_dicom: str,
+    mtime_ns: int,
+) -> Tuple[Tuple[str, str], ...]:
+    """
+    Read the tags to copy from a reference DICOM file or directory, parsing only a single file header.
+    Results are cached per reference; mtime_ns is part of the cache key so that modified references are read again.
+
+    Args:
+        reference_dicom (str): Path to a reference DICOM file or directory.
+        mtime_ns (int): Modification time of the reference in nanoseconds.
+
+    Raises:
+        RuntimeError: If no DICOM series is found in the reference directory.
+
+    Returns:
+        Tuple[Tuple[str, str], ...]: Pairs of tag and value.
+    """
+    if Path(reference_dicom).is_dir():
+        series_ids = sitk.ImageSeriesReader.GetGDCMSeriesIDs(reference_dicom)
+        if not series_ids:
+            raise RuntimeError(f"No DICOM series found in: {reference_dicom}")
+        if len(series_ids) > 1:
+            logger.warning(
+                f"More than 1 DICOM series was found in the folder: {reference_dicom}. Using the first one ({series_ids[0]}) as reference."
+            )
+        # Pick the first series by default, its first slice represents the series
+        reference_file = sitk.ImageSeriesReader.GetGDCMSeriesFileNames(
+            reference_dicom, series_ids[0]
+        )[0]
+    else:
+        reference_file = reference_dicom
+
+    reader = sitk.ImageFileReader()
+    reader.SetFileName(reference_file)
+    reader.ReadImageInformation()
+    return tuple(
+        (k, reader.GetMetaData(k.lower()))
+        for k in _REFERENCE_TAGS_TO_COPY
+        if reader.HasMetaDataKey(k.lower())
+    )
+
+
+@instrument(write_path="output_dir", array="input_image")
 def nifti_to_dicom_itk(
     input_image: Union[Path, str, sitk.Image, NDArray],
     output_dir: Union[Path, str],
     reference_dicom: Optional[Union[Path, str]] = None,
+    num_workers: int = 1,
+    series_index: Optional[DicomSeriesIndex] = None,
+    multi_frame: bool = False,
 ):
     """
     Convert a NIfTI image to DICOM format using SimpleITK.
+    By default one file is written per slice (0.dcm ... N.dcm), with `multi_frame` a single file volume.dcm.
 
     Args:
         input_image (Union[Path, str, sitk.Image, NDArray]): Path to the input NIfTI image or a SimpleITK image or numpy array.
         output_dir (Union[Path, str]): Path to the output DICOM directory.
         reference_dicom (Optional[Union[Path, str]], optional): Path to a reference DICOM file or directory for metadata. Defaults to None.
+        num_workers (int, optional): Number of threads encoding and writing slices concurrently. The output is the same as
+            for sequential writing. Defaults to 1 (sequential).
+        series_index (Optional[DicomSeriesIndex], optional): Index used to look up the series of a reference directory
+            instead of scanning it with GDCM. Defaults to None.
+        multi_frame (bool, optional): If True, write the volume as a single enhanced multi-frame DICOM object with the same
+            geometry and copied reference tags, which avoids the overhead of many small files. The volume is stored
+            as CT, or as MR for an MR reference, since GDCM writes no other multi-frame storage classes. Defaults to False.
 
     Raises:
-        RuntimeError: If no DICOM series is found in the reference directory.
+        RuntimeError: If no DICOM series is found in the reference directory, or if the multi-frame volume cannot be written.
         TypeError: If input_image is not a valid type (file path, SimpleITK.Image, or np.ndarray).
     """
 
@@ -153,64 +366,31 @@ def nifti_to_dicom_itk(
             "input_image must be a file path, SimpleITK.Image, or np.ndarray"
         )
 
-    # Write to DICOM
-    writer = sitk.ImageFileWriter()
-    tags_to_copy = [
-        # "0010|0010",  # Patient Name
-        "0010|0020",  # Patient ID
-        "0010|0030",  # Patient Birth Date
-        "0020|000D",  # Study Instance UID, for machine consumption
-        "0020|0010",  # Study ID, for human consumption
-        "0008|0020",  # Study Date
-        "0008|0030",  # Study Time
-        "0008|0050",  # Accession Number
-        "0008|0060",  # Modality
-    ]
-
-    # Use the study/series/frame of reference information given in the meta-data
-    # dictionary and not the automatically generated information from the file IO
-    writer.KeepOriginalImageUIDOn()
     modification_time = time.strftime("%H%M%S")
     modification_date = time.strftime("%Y%m%d")
     direction = image.GetDirection()
 
     if reference_dicom:
         reference_dicom_path = Path(reference_dicom)
-        if reference_dicom_path.is_dir():
-
-            series_ids = sitk.ImageSeriesReader.GetGDCMSeriesIDs(str(reference_dicom))
-            if not series_ids:
+        if not reference_dicom_path.is_dir() and not reference_dicom_path.is_file():
+            raise RuntimeError(
+                f"{reference_dicom} is not a valid DICOM file or directory."
+            )
+        if series_index is not None and reference_dicom_path.is_dir():
+            reference_series = series_index.series(reference_dicom_path)
+            if not reference_series:
                 raise RuntimeError(f"No DICOM series found in: {reference_dicom}")
-            if len(series_ids) > 1:
+            series_id, reference_files = next(iter(reference_series.items()))
+            if len(reference_series) > 1:
                 logger.warning(
-                    f"More than 1 DICOM series was found in the folder: {reference_dicom}. Using the first one ({series_ids[0]}) as reference."
+                    f"More than 1 DICOM series was found in the folder: {reference_dicom}. Using the first one ({series_id}) as reference."
                 )
-            # Pick the first series by default
-            dicom_names = sitk.ImageSeriesReader.GetGDCMSeriesFileNames(
-                str(reference_dicom), series_ids[0]
-            )
-
-            reader = sitk.ImageSeriesReader()
-            reader.SetFileNames(dicom_names)
-            reader.MetaDataDictionaryArrayUpdateOn()
-            reader.Execute()
-
-            series_tag_values = [
-                (k, reader.GetMetaData(0, k.lower()))
-                for k in tags_to_copy
-                if reader.HasMetaDataKey(0, k.lower())
-            ]
-        elif reference_dicom_path.is_file():
-            image_ref = sitk.ReadImage(str(reference_dicom))
-            series_tag_values = [
-                (k, image_ref.GetMetaData(k.lower()))
-                for k in tags_to_copy
-                if image_ref.HasMetaDataKey(k.lower())
-            ]
-        else:
-            raise RuntimeError(
-                f"{reference_dicom} is not a valid DICOM file or directory."
+            reference_dicom_path = Path(reference_files[0])
+        series_tag_values = list(
+            _read_reference_tags(
+                str(reference_dicom_path), reference_dicom_path.stat().st_mtime_ns
             )
+        )
     else:
         series_tag_values = []
 
@@ -246,27 +426,142 @@ def nifti_to_dicom_itk(
         ]
     )
 
-    try:
-        for i in range(image.GetDepth()):
-            image_slice = image[:, :, i]
-            # Tags shared by the series.
-            for tag, value in series_tag_values:
-                image_slice.SetMetaData(tag, value)
-            # Slice specific tags.
-            #   Instance Creation Date
-            image_slice.SetMetaData("0008|0012", modification_time)
-            #   Instance Creation Time
-            image_slice.SetMetaData("0008|0013", modification_date)
-            #   Image Position (Patient)
-            image_slice.SetMetaData(
-                "0020|0032",
-                "\\".join(map(str, image.TransformIndexToPhysicalPoint((0, 0, i)))),
-            )
-            #   Instance Number
-            image_slice.SetMetaData("0020|0013", str(i))
+    if multi_frame:
+        _write_dicom_volume(
+            image,
+            series_tag_values,
+            modification_time,
+            modification_date,
+            output_dir,
+        )
+        return
+
+    # Slice positions are computed once up front, the slices are independent afterwards
+    positions = [
+        "\\".join(map(str, image.TransformIndexToPhysicalPoint((0, 0, i))))
+        for i in range(image.GetDepth())
+    ]
 
-            # Write to the output directory and add the extension dcm, to force writing in DICOM format.
-            writer.SetFileName(output_dir / f"{i}.dcm")
-            writer.Execute(image_slice)
+    write_slice = partial(
+        _write_dicom_slice,
+        image,
+        series_tag_values=series_tag_values,
+        modification_time=modification_time,
+        modification_date=modification_date,
+        output_dir=output_dir,
+    )
+    try:
+        if num_workers <= 1:
+            for i, position in enumerate(positions):
+                write_slice(i, position)
+        else:
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                list(executor.map(write_slice, range(len(positions)), positions))
     except Exception as e:
         logger.error(f"Could not write DICOM image: {e}")
+
+
+def _write_dicom_volume(
+    image: sitk.Image,
+    series_tag_values: List[Tuple[str, str]],
+    modification_time: str,
+    modification_date: str,
+    output_dir: Path,
+) -> None:
+    """
+    Write a volume as a single multi-frame DICOM file; GDCM stores the geometry of every frame.
+
+    Args:
+        image (sitk.Image): The volume.
+        series_tag_values (List[Tuple[str, str]]): Tags shared by the series.
+        modification_time (str): Time of the export.
+        modification_date (str): Date of the export.
+        output_dir (Path): Path to the output DICOM directory.
+
+    Raises:
+        RuntimeError: If the volume cannot be written, e.g. for floating point images. No file is left behind.
+    """
+    # Copy so that the meta-data of the caller's image is left untouched
+    volume = sitk.Image(image)
+    for tag, value in series_tag_values:
+        volume.SetMetaData(tag, value)
+    # GDCM only writes multi-frame objects of an image storage class it knows, which it derives from
+    # the modality; without a CT or MR modality (e.g. no reference or "OT") the file would be empty
+    modality = (
+        volume.GetMetaData("0008|0060").strip().upper()
+        if volume.HasMetaDataKey("0008|0060")
+        else ""
+    )
+    if modality not in _MULTI_FRAME_SOP_CLASS_UIDS:
+        if modality:
+            logger.warning(
+                f"Multi-frame DICOM supports the modalities CT and MR only, writing the {modality} volume as CT."
+            )
+        modality = "CT"
+    #   Modality, matching the storage class
+    volume.SetMetaData("0008|0060", modality)
+    #   SOP Class UID
+    volume.SetMetaData("0008|0016", _MULTI_FRAME_SOP_CLASS_UIDS[modality])
+    #   Instance Creation Date
+    volume.SetMetaData("0008|0012", modification_date)
+    #   Instance Creation Time
+    volume.SetMetaData("0008|0013", modification_time)
+    #   Instance Number
+    volume.SetMetaData("0020|0013", "0")
+
+    writer = sitk.ImageFileWriter()
+    # Use the study/series/frame of reference information given in the meta-data
+    # dictionary and not the automatically generated information from the file IO
+    writer.KeepOriginalImageUIDOn()
+    volume_path = output_dir / "volume.dcm"
+    writer.SetFileName(volume_path)
+    try:
+        writer.Execute(volume)
+    except RuntimeError as e:
+        volume_path.unlink(missing_ok=True)
+        raise RuntimeError(f"Could not write DICOM image {volume_path}: {e}") from e
+
+
+def _write_dicom_slice(
+    image: sitk.Image,
+    i: int,
+    position: str,
+    series_tag_values: List[Tuple[str, str]],
+    modification_time: str,
+    modification_date: str,
+    output_dir: Path,
+) -> None:
+    """
+    Write a single slice of a volume as a DICOM file.
+
+    Args:
+        image (sitk.Image): The volume.
+        i (int): Index of the slice.
+        position (str): Image Position (Patient) of the slice.
+        series_tag_values (List[Tuple[str, str]]): Tags shared by the series.
+        modification_time (str): Time of the export.
+        modification_date (str): Date of the export.
+        output_dir (Path): Path to the output DICOM directory.
+    """
+    image_slice = image[:, :, i]
+    # Tags shared by the series.
+    for tag, value in series_tag_values:
+        image_slice.SetMetaData(tag, value)
+    # Slice specific tags.
+    #   Instance Creation Date
+    image_slice.SetMetaData("0008|0012", modification_date)
+    #   Instance Creation Time
+    image_slice.SetMetaData("0008|0013", modification_time)
+    #   Image Position (Patient)
+    image_slice.SetMetaData("0020|0032", position)
+    #   Instance Number
+    image_slice.SetMetaData("0020|0013", str(i))
+
+    # Write to DICOM, one writer per slice so that slices can be written concurrently
+    writer = sitk.ImageFileWriter()
+    # Use the study/series/frame of reference information given in the meta-data
+    # dictionary and not the automatically generated information from the file IO
+    writer.KeepOriginalImageUIDOn()
+    # Write to the output directory and add the extension dcm, to force writing in DICOM format.
+    writer.SetFileName(output_dir / f"{i}.dcm")
+    writer.Execute(image_slice)
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from auxiliary._lazy import LazyImport
+
+# heavy backends are only imported on first use
+sitk = LazyImport("SimpleITK")
+logger = LazyImport("loguru", "logger")
+
+_INDEX_VERSION = 2
+
+
+def _read_series_entry(file_path: str) -> Tuple[Optional[str], float]:
+    """
+    Read the series UID and the slice sort key of a DICOM file from its header.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        Tuple[Optional[str], float]: The Series Instance UID (None for files that are not DICOM) and the position
+            of the slice along its normal, falling back to the Instance Number.
+    """
+    reader = sitk.ImageFileReader()
+    reader.SetImageIO("GDCMImageIO")
+    reader.SetFileName(file_path)
+    try:
+        reader.ReadImageInformation()
+    except RuntimeError:
+        return None, 0.0
+    if not reader.HasMetaDataKey("0020|000e"):
+        return None, 0.0
+    series_uid = reader.GetMetaData("0020|000e").strip()
+
+    sort_key = 0.0
+    try:
+        if reader.HasMetaDataKey("0020|0032") and reader.HasMetaDataKey("0020|0037"):
+            orientation = [
+                float(v) for v in reader.GetMetaData("0020|0037").split("\\")
+            ]
+            position = [float(v) for v in reader.GetMetaData("0020|0032").split("\\")]
+            normal = np.cross(orientation[:3], orientation[3:6])
+            sort_key = float(np.dot(normal, position))
+        elif reader.HasMetaDataKey("0020|0013"):
+            sort_key = float(reader.GetMetaData("0020|0013"))
+    except ValueError:
+        pass
+    return series_uid, sort_key
+
+
+class DicomSeriesIndex:
+    """
+    Persistent index of the DICOM series in directories, a faster alternative to
+    `sitk.ImageSeriesReader.GetGDCMSeriesIDs` and `GetGDCMSeriesFileNames`.
+
+    Each directory is scanned once with parallel header reads. Per file, the modification time, size,
+    series UID and slice position are recorded, so revisiting a directory only re-reads files that changed.
+    The index can be shared by threads. If an index path is given, the index is stored as JSON and reused across
+    processes. It is saved every
+    `save_every` updated directories and by `save`, which is also called when leaving a `with` block:
+
+        with DicomSeriesIndex("index.json") as series_index:
+            for directory in directories:
+                dicom_to_nifti_itk(directory, output_dir, series_index=series_index)
+
+    Args:
+        index_path (Union[Path, str], optional): Path of the JSON file the index is loaded from and saved to.
+            Defaults to None (in-memory only).
+        num_workers (int): Number of threads reading file headers. Defaults to 8.
+        save_every (int): Number of updated directories after which the index is saved automatically.
+            Defaults to 100.
+    """
+
+    def __init__(
+        self,
+        index_path: Optional[Union[Path, str]] = None,
+        num_workers: int = 8,
+        save_every: int = 100,
+    ) -> None:
+        self.index_path = Path(index_path) if index_path is not None else None
+        self.num_workers = num_workers
+        self.save_every = save_every
+        # directory -> file name -> [mtime_ns, size, series UID or None, sort key]
+        self.directories: Dict[str, Dict[str, list]] = {}
+        # number of directories updated since the last save
+        self._unsaved = 0
+        # guards the updates and saves; header reads run outside of it
+        self._lock = threading.RLock()
+        if self.index_path is not None and self.index_path.exists():
+            with open(self.index_path) as index_file:
+                index = json.load(index_file)
+            if index.get("version") == _INDEX_VERSION:
+                self.directories = index["directories"]
+
+    def __enter__(self) -> "DicomSeriesIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.save()
+
+    def save(self) -> None:
+        """
+        Save the index to its index path, if one was given and it changed since the last save.
+        """
+        with self._lock:
+            if self.index_path is None or not self._unsaved:
+                return
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            temporary_path = self.index_path.with_name(self.index_path.name + ".tmp")
+            with open(temporary_path, "w") as index_file:
+                json.dump(
+                    {"version": _INDEX_VERSION, "directories": self.directories},
+                    index_file,
+                )
+            # replace atomically so that an interrupted save never corrupts the index
+            os.replace(temporary_path, self.index_path)
+            self._unsaved = 0
+
+    def series(self, directory: Union[Path, str]) -> Dict[str, List[str]]:
+        """
+        Return the DICOM series in a directory, updating the index for new, modified or removed files.
+
+        Args:
+            directory (Union[Path, str]): Path to the DICOM directory (not searched recursively).
+
+        Returns:
+            Dict[str, List[str]]: Series UIDs mapped to the file paths of the series, sorted by slice position.
+        """
+        directory = Path(directory).absolute()
+        stats = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    stats[entry.name] = (stat.st_mtime_ns, stat.st_size)
+
+        files = self.directories.get(str(directory), {})
+        changed = [
+            file_name
+            for file_name, (mtime_ns, size) in stats.items()
+            if files.get(file_name, [None, None])[:2] != [mtime_ns, size]
+        ]
+        removed = len(files.keys() - stats.keys())
+
+        if changed or removed:
+            # entries of removed files are dropped by keeping only the files present now
+            files = {
+                file_name: files[file_name] for file_name in stats if file_name in files
+            }
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                entries = executor.map(
+                    _read_series_entry,
+                    [str(directory / file_name) for file_name in changed],
+                )
+                for file_name, (series_uid, sort_key) in zip(changed, entries):
+                    files[file_name] = [*stats[file_name], series_uid, sort_key]
+            logger.debug(f"Indexed {len(changed)} new or modified files in {directory}")
+            with self._lock:
+                # the entries of a directory are replaced, never modified, so saves see consistent entries
+                self.directories[str(directory)] = files
+                self._unsaved += 1
+                if self._unsaved >= self.save_every:
+                    self.save()
+
+        series: Dict[str, List[Tuple[float, str]]] = {}
+        for file_name, (_, _, series_uid, sort_key) in files.items():
+            if series_uid is not None:
+                series.setdefault(series_uid, []).append(
+                    (sort_key, str(directory / file_name))
+                )
+        return {
+            series_uid: [file_path for _, file_path in sorted(slices)]
+            for series_uid, slices in sorted(series.items())
+        }
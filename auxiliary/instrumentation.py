@@ -0,0 +1,392 @@
+"""
+Opt-in timing and memory instrumentation of the I/O, conversion and normalization functions of auxiliary.
+
+Instrumentation is disabled by default; an instrumented function then only checks whether any sink is registered.
+Once enabled, every call of an instrumented function emits an `Event` to all registered sinks:
+
+    from auxiliary import instrumentation
+
+    aggregator = instrumentation.Aggregator()
+    with instrumentation.instrumented(aggregator, instrumentation.JsonlSink("events.jsonl")):
+        read_image("t1.nii.gz")
+    print(aggregator.summary())
+
+A sink is any callable taking an `Event`.
+"""
+
+import functools
+import json
+import math
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+
+class Event(NamedTuple):
+    """
+    Measurements of a single call of an instrumented function.
+
+    Attributes:
+        name (str): Qualified name of the function, e.g. "auxiliary.io.read_image".
+        timestamp (float): Start of the call as seconds since the epoch.
+        duration (float): Wall time of the call in seconds.
+        bytes_read (int, optional): Size of the input file or directory, of the input array, or of the region read
+            from a file.
+        bytes_written (int, optional): Size of the output file or directory, or of the output array.
+        shape (Tuple[int, ...], optional): Shape of the output array, or of the input array.
+        dtype (str, optional): Dtype of the output array, or of the input array.
+        peak_memory (int, optional): Peak of the memory traced by tracemalloc during the call, in bytes, relative to
+            its start. Only measured with `trace_memory` and for calls that start while no other instrumented call,
+            in any thread, is in progress.
+        error (str, optional): Representation of the exception raised by the call, if any.
+    """
+
+    name: str
+    timestamp: float
+    duration: float
+    bytes_read: Optional[int]
+    bytes_written: Optional[int]
+    shape: Optional[Tuple[int, ...]]
+    dtype: Optional[str]
+    peak_memory: Optional[int]
+    error: Optional[str]
+
+
+Sink = Callable[[Event], None]
+
+_sinks: List[Sink] = []
+_trace_memory = False
+_started_tracemalloc = False
+_lock = threading.Lock()
+# number of instrumented calls in progress, in any thread
+_active_calls = 0
+
+
+def enable(*sinks: Sink, trace_memory: bool = False) -> None:
+    """
+    Register sinks and start instrumenting calls.
+
+    Args:
+        *sinks (Sink): Callables receiving every `Event`.
+        trace_memory (bool): If True, measure the peak allocation of each call with tracemalloc.
+            This slows down allocation-heavy Python code considerably. Memory allocated by SimpleITK is not traced,
+            NumPy arrays are. The peak is process-wide, so nested and concurrent calls are attributed to the outermost call.
+    """
+    global _trace_memory, _started_tracemalloc
+    with _lock:
+        _sinks.extend(sinks)
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracemalloc = True
+        _trace_memory = _trace_memory or trace_memory
+
+
+def disable(*sinks: Sink) -> None:
+    """
+    Unregister sinks, stopping instrumentation once no sink is left.
+
+    Args:
+        *sinks (Sink): The sinks to remove. Defaults to all sinks.
+    """
+    global _trace_memory, _started_tracemalloc
+    with _lock:
+        if sinks:
+            for sink in sinks:
+                if sink in _sinks:
+                    _sinks.remove(sink)
+        else:
+            _sinks.clear()
+        if not _sinks:
+            _trace_memory = False
+            if _started_tracemalloc:
+                tracemalloc.stop()
+                _started_tracemalloc = False
+
+
+@contextmanager
+def instrumented(*sinks: Sink, trace_memory: bool = False) -> Iterator[None]:
+    """
+    Context manager that instruments all calls within its block, see `enable`.
+    """
+    enable(*sinks, trace_memory=trace_memory)
+    try:
+        yield
+    finally:
+        disable(*sinks)
+
+
+def is_enabled() -> bool:
+    """
+    Return whether any sink is registered.
+    """
+    return bool(_sinks)
+
+
+def emit(event: Event) -> None:
+    """
+    Send an event to all registered sinks.
+    """
+    for sink in list(_sinks):
+        sink(event)
+
+
+def _path_size(path) -> Optional[int]:
+    """
+    Return the size of a file or the total size of the files in a directory (not recursive).
+    """
+    if path is None or not isinstance(path, (str, os.PathLike)):
+        return None
+    try:
+        if os.path.isdir(path):
+            with os.scandir(path) as entries:
+                return sum(entry.stat().st_size for entry in entries if entry.is_file())
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def _describe_array(value) -> Tuple[Optional[Tuple[int, ...]], Optional[str]]:
+    """
+    Return shape and dtype of a NumPy array or sitk.Image, or of the first element of a tuple.
+    """
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if hasattr(value, "shape") and hasattr(value, "dtype"):
+        return tuple(value.shape), str(value.dtype)
+    if hasattr(value, "GetSize") and hasattr(value, "GetPixelIDTypeAsString"):
+        return tuple(reversed(value.GetSize())), value.GetPixelIDTypeAsString()
+    return None, None
+
+
+def _array_size(value) -> Optional[int]:
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    return getattr(value, "nbytes", None)
+
+
+def instrument(
+    name: Optional[str] = None,
+    read_path: Optional[str] = None,
+    write_path: Optional[str] = None,
+    array: Optional[str] = None,
+    read_result: bool = False,
+) -> Callable[[Callable], Callable]:
+    """
+    Decorator emitting an `Event` for every call of the function while instrumentation is enabled.
+
+    Args:
+        name (str, optional): Name of the events. Defaults to the module and qualified name of the function.
+        read_path (str, optional): Name of the argument holding the input file or directory, whose size is reported
+            as `bytes_read`. Defaults to the size of the `array` argument.
+        write_path (str, optional): Name of the argument holding the output file or directory, whose size after
+            the call is reported as `bytes_written`. Defaults to the size of the returned array.
+        array (str, optional): Name of the argument holding the input array, whose shape and dtype are reported
+            if the function does not return an array.
+        read_result (bool): If True, report the size of the returned array as `bytes_read`, e.g. for functions
+            reading a region of a file, of which the file size would overstate the amount read. Defaults to False.
+
+    Returns:
+        Callable: The decorator.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        event_name = name or f"{func.__module__}.{func.__qualname__}"
+        signature = None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # the only cost while instrumentation is disabled
+            if not _sinks:
+                return func(*args, **kwargs)
+
+            nonlocal signature
+            if signature is None:
+                import inspect
+
+                signature = inspect.signature(func)
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            input_array = arguments.get(array) if array else None
+
+            global _active_calls
+            with _lock:
+                # the tracemalloc peak is process-wide, so it is only reset if no other call is measured
+                trace_memory = (
+                    _trace_memory and _active_calls == 0 and tracemalloc.is_tracing()
+                )
+                _active_calls += 1
+            if trace_memory:
+                tracemalloc.reset_peak()
+                start_memory = tracemalloc.get_traced_memory()[0]
+
+            error = None
+            result = None
+            timestamp = time.time()
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                return result
+            except BaseException as e:
+                error = repr(e)
+                raise
+            finally:
+                duration = time.perf_counter() - start
+                with _lock:
+                    _active_calls -= 1
+                peak_memory = (
+                    tracemalloc.get_traced_memory()[1] - start_memory
+                    if trace_memory
+                    else None
+                )
+                shape, dtype = _describe_array(result)
+                if shape is None:
+                    shape, dtype = _describe_array(input_array)
+                emit(
+                    Event(
+                        name=event_name,
+                        timestamp=timestamp,
+                        duration=duration,
+                        bytes_read=(
+                            _array_size(result)
+                            if read_result
+                            else (
+                                _path_size(arguments.get(read_path))
+                                if read_path
+                                else _array_size(input_array)
+                            )
+                        ),
+                        bytes_written=(
+                            _path_size(arguments.get(write_path))
+                            if write_path
+                            else _array_size(result)
+                        ),
+                        shape=shape,
+                        dtype=dtype,
+                        peak_memory=peak_memory,
+                        error=error,
+                    )
+                )
+
+        return wrapper
+
+    return decorator
+
+
+class LoguruSink:
+    """
+    Sink logging every event with loguru.
+
+    Args:
+        level (str): The log level. Defaults to "DEBUG".
+    """
+
+    def __init__(self, level: str = "DEBUG") -> None:
+        from loguru import logger
+
+        self.logger = logger
+        self.level = level
+
+    def __call__(self, event: Event) -> None:
+        self.logger.log(
+            self.level,
+            "{} took {:.3f} s (read {}, written {}, shape {}, dtype {}, peak memory {}){}",
+            event.name,
+            event.duration,
+            event.bytes_read,
+            event.bytes_written,
+            event.shape,
+            event.dtype,
+            event.peak_memory,
+            f", failed with {event.error}" if event.error else "",
+        )
+
+
+class JsonlSink:
+    """
+    Sink appending every event as a JSON line to a file.
+
+    Args:
+        path (Union[Path, str]): Path of the JSON Lines file.
+    """
+
+    def __init__(self, path: Union[Path, str]) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def __call__(self, event: Event) -> None:
+        line = json.dumps(event._asdict()) + "\n"
+        with self._lock, open(self.path, "a") as jsonl_file:
+            jsonl_file.write(line)
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    # linear interpolation between the closest ranks, as np.percentile
+    rank = percentile / 100 * (len(sorted_values) - 1)
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (
+        rank - lower
+    )
+
+
+class Aggregator:
+    """
+    Sink collecting events in memory and summarizing them per function.
+
+    Args:
+        percentiles (Tuple[float, ...]): Percentiles of the durations reported by `summary`. Defaults to (50, 90, 99).
+    """
+
+    def __init__(self, percentiles: Tuple[float, ...] = (50, 90, 99)) -> None:
+        self.percentiles = percentiles
+        self.events: List[Event] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, event: Event) -> None:
+        with self._lock:
+            self.events.append(event)
+
+    def reset(self) -> None:
+        """
+        Discard all collected events.
+        """
+        with self._lock:
+            self.events.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarize the collected events per function.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Per function name, the number of calls and errors, the total and mean duration,
+                the duration percentiles (e.g. "p50"), the total bytes read and written and the maximal peak memory.
+        """
+        with self._lock:
+            events = list(self.events)
+
+        grouped: Dict[str, List[Event]] = {}
+        for event in events:
+            grouped.setdefault(event.name, []).append(event)
+
+        summary = {}
+        for event_name, group in grouped.items():
+            durations = sorted(event.duration for event in group)
+            peaks = [e.peak_memory for e in group if e.peak_memory is not None]
+            stats = {
+                "count": len(group),
+                "errors": sum(event.error is not None for event in group),
+                "total": sum(durations),
+                "mean": sum(durations) / len(durations),
+            }
+            for percentile in self.percentiles:
+                stats[f"p{percentile:g}"] = _percentile(durations, percentile)
+            stats.update(
+                bytes_read=sum(event.bytes_read or 0 for event in group),
+                bytes_written=sum(event.bytes_written or 0 for event in group),
+                peak_memory=max(peaks) if peaks else None,
+            )
+            summary[event_name] = stats
+        return summary
@@ -1,15 +1,147 @@
+from __future__ import annotations
+
+import os
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import NamedTuple, Optional, Sequence, Tuple, Union
 
 import numpy as np
-import SimpleITK as sitk
 from numpy.typing import NDArray
 
+from auxiliary._lazy import LazyImport
+from auxiliary.instrumentation import instrument
+
+# SimpleITK is only imported on first use
+sitk = LazyImport("SimpleITK")
+
+# NumPy dtypes of the SimpleITK pixel types, vector types map to their component type
+_SITK_TO_NUMPY_DTYPE_NAMES = {
+    "sitkUInt8": np.uint8,
+    "sitkInt8": np.int8,
+    "sitkUInt16": np.uint16,
+    "sitkInt16": np.int16,
+    "sitkUInt32": np.uint32,
+    "sitkInt32": np.int32,
+    "sitkUInt64": np.uint64,
+    "sitkInt64": np.int64,
+    "sitkFloat32": np.float32,
+    "sitkFloat64": np.float64,
+    "sitkComplexFloat32": np.complex64,
+    "sitkComplexFloat64": np.complex128,
+    "sitkVectorUInt8": np.uint8,
+    "sitkVectorInt8": np.int8,
+    "sitkVectorUInt16": np.uint16,
+    "sitkVectorInt16": np.int16,
+    "sitkVectorUInt32": np.uint32,
+    "sitkVectorInt32": np.int32,
+    "sitkVectorUInt64": np.uint64,
+    "sitkVectorInt64": np.int64,
+    "sitkVectorFloat32": np.float32,
+    "sitkVectorFloat64": np.float64,
+}
+
+
+@lru_cache(maxsize=None)
+def _sitk_to_numpy_dtypes() -> dict:
+    # keyed by pixel ID, which requires importing SimpleITK
+    return {
+        getattr(sitk, name): dtype for name, dtype in _SITK_TO_NUMPY_DTYPE_NAMES.items()
+    }
+
+
+class ImageInfo(NamedTuple):
+    """
+    Lightweight, hashable image metadata as returned by `read_image_info`.
+
+    Attributes:
+        shape (Tuple[int, ...]): Shape of the array returned by `read_image` (zyx order, components last).
+        spacing (Tuple[float, ...]): Voxel spacing (xyz order).
+        origin (Tuple[float, ...]): Physical origin (xyz order).
+        direction (Tuple[float, ...]): Flattened direction cosine matrix.
+        dtype (str): NumPy dtype name of the pixel components, e.g. "int16".
+        number_of_components (int): Number of components per pixel.
+    """
+
+    shape: Tuple[int, ...]
+    spacing: Tuple[float, ...]
+    origin: Tuple[float, ...]
+    direction: Tuple[float, ...]
+    dtype: str
+    number_of_components: int
+
+
+def read_image_info(input_path: str) -> ImageInfo:
+    """
+    Read the metadata of an image file without loading its pixel data.
+    Only the header is parsed, e.g. a .nii.gz file is not fully decompressed.
+
+    Args:
+        input_path (str): Path to the input file.
+
+    Returns:
+        ImageInfo: The shape, spacing, origin, direction and dtype of the image.
+    """
+    reader = sitk.ImageFileReader()
+    reader.SetFileName(str(input_path))
+    reader.ReadImageInformation()
+    return _make_image_info(reader, reader.GetNumberOfComponents())
+
+
+def get_image_info(image: sitk.Image) -> ImageInfo:
+    """
+    Get the metadata of a SimpleITK image as an ImageInfo, e.g. to keep the geometry of an image next to its array.
+
+    Args:
+        image (sitk.Image): The image.
+
+    Returns:
+        ImageInfo: The shape, spacing, origin, direction and dtype of the image.
+    """
+    return _make_image_info(image, image.GetNumberOfComponentsPerPixel())
+
+
+def _make_image_info(
+    source: Union[sitk.Image, sitk.ImageFileReader], number_of_components: int
+) -> ImageInfo:
+    shape = tuple(reversed(source.GetSize()))
+    if number_of_components > 1:
+        shape += (number_of_components,)
+
+    return ImageInfo(
+        shape=shape,
+        spacing=source.GetSpacing(),
+        origin=source.GetOrigin(),
+        direction=source.GetDirection(),
+        dtype=np.dtype(_sitk_to_numpy_dtypes()[source.GetPixelID()]).name,
+        number_of_components=number_of_components,
+    )
+
+
+@lru_cache(maxsize=128)
+def _read_cached_image_info(input_path: str, mtime_ns: int) -> ImageInfo:
+    # mtime_ns is part of the cache key so that modified files are read again
+    return read_image_info(input_path)
+
+
+def _copy_geometry(image: sitk.Image, reference: ImageInfo) -> None:
+    """
+    Copy spacing, origin and direction of a reference to an image, like `sitk.Image.CopyInformation`.
+    """
+    reference_size = tuple(reversed(reference.shape[: len(image.GetSize())]))
+    if image.GetSize() != reference_size:
+        raise RuntimeError(
+            f"Image size {image.GetSize()} does not match the reference size {reference_size}."
+        )
+    image.SetSpacing(reference.spacing)
+    image.SetOrigin(reference.origin)
+    image.SetDirection(reference.direction)
+
 
+@instrument(write_path="output_path", array="input_array")
 def write_image(
     input_array: str | NDArray,
     output_path: str,
-    reference_path: Optional[str] = None,
+    reference_path: Optional[Union[str, sitk.Image, ImageInfo]] = None,
     create_parent_directory: bool = False,
 ) -> None:
     """
@@ -20,7 +152,8 @@ def write_image(
         input_array (numpy.ndarray or str): The NumPy array containing the data to be written or the path to it.
             Note: boolean arrays will be converted to uint8.
         output_path (str): The path where the output file will be saved.
-        reference_path (str, optional): Path to a reference file for spatial metadata.
+        reference_path (str, sitk.Image or ImageInfo, optional): Reference for spatial metadata. Either a path to a reference file,
+            of which only the header is read (cached by path and modification time), a pre-loaded sitk.Image or an ImageInfo.
         create_parent_directory (bool): If True, create parent directories if they don't exist.
 
     Returns:
@@ -35,9 +168,15 @@ def write_image(
     # Convert NumPy array to SimpleITK image (zyx expected)
     image = sitk.GetImageFromArray(input_array)
 
-    if reference_path:
-        reference = sitk.ReadImage(reference_path)
-        image.CopyInformation(reference)
+    if isinstance(reference_path, sitk.Image):
+        image.CopyInformation(reference_path)
+    elif isinstance(reference_path, ImageInfo):
+        _copy_geometry(image, reference_path)
+    elif reference_path:
+        reference = _read_cached_image_info(
+            str(reference_path), os.stat(reference_path).st_mtime_ns
+        )
+        _copy_geometry(image, reference)
 
     if create_parent_directory:
         parent_dir = Path(output_path).parent
@@ -46,10 +185,26 @@ def write_image(
     sitk.WriteImage(image, output_path)
 
 
+class _ImageArrayBuffer:
+    """
+    Exposes the pixel buffer of a sitk.Image to NumPy while keeping the image alive.
+
+    Arrays created from this object hold a reference to it as their base, so the sitk.Image
+    backing the memory is only released once the last array view is garbage collected.
+    """
+
+    def __init__(self, image: sitk.Image):
+        self.image = image
+        self.__array_interface__ = sitk.GetArrayViewFromImage(image).__array_interface__
+
+
+@instrument(read_path="input_path")
 def read_image(
     input_path: str,
     force_dtype: Optional[int] = None,
-) -> NDArray:
+    zero_copy: bool = False,
+    return_image: bool = False,
+) -> Union[NDArray, Tuple[NDArray, sitk.Image]]:
     """
     Read an image file using SimpleITK and return its data as a NumPy array.
     Supports e.g. NIfTI and other formats. More details: https://simpleitk.readthedocs.io/en/master/IO.html
@@ -57,15 +212,132 @@ def read_image(
     Args:
         input_path (str): Path to the input file.
         force_dtype: Optional[int]: If provided, cast the image to the given sitk data type, e.g. sitk.sitkFloat32.
+        zero_copy (bool): If True, return a read-only view of the decoded sitk.Image buffer instead of a copy,
+            which avoids doubling peak memory. The backing image is kept alive as long as the array exists.
+        return_image (bool): If True, also return the sitk.Image the array was taken from, e.g. for its geometry.
 
     Returns:
         numpy.ndarray: Image data as a NumPy array.
+            If `return_image` is True, a tuple of the array and the sitk.Image.
     """
 
     image = sitk.ReadImage(input_path)
-    if force_dtype is None:
+    return image_to_array(
+        image, force_dtype=force_dtype, zero_copy=zero_copy, return_image=return_image
+    )
+
+
+def image_to_array(
+    image: sitk.Image,
+    force_dtype: Optional[int] = None,
+    zero_copy: bool = False,
+    return_image: bool = False,
+) -> Union[NDArray, Tuple[NDArray, sitk.Image]]:
+    """
+    Convert a SimpleITK image to a NumPy array.
+
+    Args:
+        image (sitk.Image): The image.
+        force_dtype: Optional[int]: If provided, cast the image to the given sitk data type, e.g. sitk.sitkFloat32.
+        zero_copy (bool): If True, return a read-only view of the image buffer instead of a copy.
+            The image is kept alive as long as the array exists.
+        return_image (bool): If True, also return the (cast) sitk.Image.
+
+    Returns:
+        numpy.ndarray: Image data as a NumPy array.
+            If `return_image` is True, a tuple of the array and the sitk.Image.
+    """
+    if force_dtype is not None:
+        image = sitk.Cast(image, force_dtype)
+
+    if zero_copy:
+        array = np.asarray(_ImageArrayBuffer(image))
+    else:
         array = sitk.GetArrayFromImage(image)
+
+    if return_image:
+        return array, image
+    return array
+
+
+@instrument(read_result=True)
+def read_image_region(
+    input_path: str,
+    index: Optional[Sequence[int]] = None,
+    size: Optional[Sequence[int]] = None,
+    slices: Optional[Sequence[slice]] = None,
+    force_dtype: Optional[int] = None,
+    return_image: bool = False,
+) -> Union[NDArray, Tuple[NDArray, sitk.Image]]:
+    """
+    Read a region of interest of an image file, e.g. a tumor bounding box or a slab of slices.
+    Uses ITK streaming so that formats supporting it only read the requested region from disk;
+    other formats are read by ITK and cropped. The returned sitk.Image keeps the physical position of the region.
+
+    All indices are given in NumPy (zyx) order, matching the arrays returned by `read_image`.
+
+    Args:
+        input_path (str): Path to the input file.
+        index (Sequence[int], optional): Start index of the region. Defaults to the image origin.
+        size (Sequence[int], optional): Size of the region. Defaults to the remainder of the image after `index`.
+        slices (Sequence[slice], optional): Slice objects selecting the region, as an alternative to `index` and `size`,
+            e.g. `(slice(40, 60),)` for the slices 40 to 59. Positive steps are supported; the spacing of the returned
+            sitk.Image is multiplied by the steps.
+        force_dtype: Optional[int]: If provided, cast the image to the given sitk data type, e.g. sitk.sitkFloat32.
+        return_image (bool): If True, also return the sitk.Image of the region.
+
+    Raises:
+        ValueError: If both `slices` and `index`/`size` are given, or if the region is empty or out of bounds.
+
+    Returns:
+        numpy.ndarray: Region data as a NumPy array.
+            If `return_image` is True, a tuple of the array and the sitk.Image.
+    """
+    info = read_image_info(input_path)
+    shape = info.shape[: len(info.shape) - (info.number_of_components > 1)]
+
+    steps = (slice(None),) * len(shape)
+    if slices is not None:
+        if index is not None or size is not None:
+            raise ValueError("Provide either slices or index and size, not both.")
+        slices = tuple(slices) + (slice(None),) * (len(shape) - len(slices))
+        ranges = [range(*s.indices(n)) for s, n in zip(slices, shape)]
+        if any(len(r) == 0 or r.step < 0 for r in ranges):
+            raise ValueError(
+                f"Slices {slices} select an empty region or use a negative step."
+            )
+        index = [r[0] for r in ranges]
+        size = [r[-1] - r[0] + 1 for r in ranges]
+        steps = tuple(slice(None, None, r.step) for r in ranges)
     else:
-        array = sitk.GetArrayFromImage(sitk.Cast(image, force_dtype))
+        index = list(index) if index is not None else [0] * len(shape)
+        if size is None:
+            size = [n - i for n, i in zip(shape, index)]
+
+    if not len(index) == len(size) == len(shape) or any(
+        i < 0 or s <= 0 or i + s > n for i, s, n in zip(index, size, shape)
+    ):
+        raise ValueError(
+            f"Region with index {tuple(index)} and size {tuple(size)} does not fit into an image of shape {shape}."
+        )
+
+    try:
+        reader = sitk.ImageFileReader()
+        reader.SetFileName(str(input_path))
+        reader.SetExtractIndex([int(i) for i in reversed(index)])
+        reader.SetExtractSize([int(s) for s in reversed(size)])
+        image = reader.Execute()
+    except RuntimeError:
+        # fall back to reading the full image for readers that do not support extraction
+        image = sitk.ReadImage(str(input_path))[
+            tuple(slice(i, i + s) for i, s in zip(reversed(index), reversed(size)))
+        ]
 
+    array, image = image_to_array(image, force_dtype=force_dtype, return_image=True)
+    if all(step.step in (None, 1) for step in steps):
+        return (array, image) if return_image else array
+    array = array[steps]
+    if return_image:
+        # subsampling the image as well scales its spacing by the steps
+        return array, image[tuple(reversed(steps))]
     return array
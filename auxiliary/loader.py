@@ -0,0 +1,131 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Iterator, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+from auxiliary.io import read_image
+from auxiliary.normalization.normalizer_base import Normalizer
+from auxiliary.tiff.io import read_tiff
+
+TIFF_SUFFIXES = (".tif", ".tiff")
+
+
+class LoadedVolume(NamedTuple):
+    """
+    A volume produced by `VolumeLoader`.
+
+    Attributes:
+        index (int): Position of the path in the list of paths.
+        path (str): Path of the volume.
+        array (np.ndarray, optional): The loaded and normalized volume, None if loading failed.
+        error (BaseException, optional): The exception raised while loading or normalizing, None on success.
+    """
+
+    index: int
+    path: str
+    array: Optional[np.ndarray]
+    error: Optional[BaseException]
+
+
+def read_volume(path: Union[Path, str]) -> np.ndarray:
+    """
+    Read a volume with `read_tiff` for TIFF files and `read_image` otherwise, e.g. for NIfTI files.
+
+    Args:
+        path (Union[Path, str]): Path to the file.
+
+    Returns:
+        np.ndarray: The volume.
+    """
+    if str(path).lower().endswith(TIFF_SUFFIXES):
+        return read_tiff(str(path))
+    return read_image(str(path))
+
+
+class VolumeLoader:
+    """
+    Iterate over volumes that are read and normalized ahead of the consumer on a background thread pool.
+
+    Decoding (e.g. gunzip of .nii.gz files) and normalization of the next volumes overlap with the processing
+    of the current one. At most `prefetch` volumes are in flight or waiting to be consumed, which bounds memory.
+    Failures do not stop the iteration; the exception is attached to the item of the failed path.
+    The loader can be iterated several times, e.g. once per epoch.
+
+    Args:
+        paths (Sequence[Union[Path, str]]): Paths of the volumes, e.g. NIfTI or TIFF files.
+        normalizer (Normalizer, optional): Normalizer applied to each volume. Defaults to None.
+        fitted (bool): If True, apply the cohort-level `transform` of a fitted normalizer instead of `normalize`.
+            Defaults to False.
+        num_workers (int): Number of threads reading and normalizing volumes. Defaults to 4.
+        prefetch (int): Maximum number of volumes loaded ahead of the consumer. Defaults to twice `num_workers`.
+        ordered (bool): If True, yield volumes in the order of `paths`, otherwise as soon as they are loaded.
+            Defaults to True.
+        reader (Callable, optional): Function reading a path into an array. Defaults to `read_volume`.
+    """
+
+    def __init__(
+        self,
+        paths: Sequence[Union[Path, str]],
+        normalizer: Optional[Normalizer] = None,
+        fitted: bool = False,
+        num_workers: int = 4,
+        prefetch: Optional[int] = None,
+        ordered: bool = True,
+        reader: Optional[Callable[[str], np.ndarray]] = None,
+    ) -> None:
+        self.paths = [str(path) for path in paths]
+        self.normalizer = normalizer
+        self.fitted = fitted
+        self.num_workers = num_workers
+        self.prefetch = max(1, prefetch if prefetch is not None else 2 * num_workers)
+        self.ordered = ordered
+        self.reader = reader or read_volume
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def _load(self, index: int) -> LoadedVolume:
+        path = self.paths[index]
+        try:
+            array = self.reader(path)
+            if self.normalizer is not None:
+                if self.fitted:
+                    array = self.normalizer.transform(array)
+                else:
+                    array = self.normalizer.normalize(array)
+        except Exception as e:
+            return LoadedVolume(index, path, None, e)
+        return LoadedVolume(index, path, array, None)
+
+    def __iter__(self) -> Iterator[LoadedVolume]:
+        executor = ThreadPoolExecutor(
+            max_workers=self.num_workers, thread_name_prefix="auxiliary-loader"
+        )
+        pending: "deque[Future]" = deque()
+        indices = iter(range(len(self.paths)))
+
+        def _submit() -> None:
+            # keep the prefetch window full
+            while len(pending) < self.prefetch:
+                index = next(indices, None)
+                if index is None:
+                    return
+                pending.append(executor.submit(self._load, index))
+
+        try:
+            _submit()
+            while pending:
+                if self.ordered:
+                    future = pending.popleft()
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    future = next(iter(done))
+                    pending.remove(future)
+                result = future.result()
+                _submit()
+                yield result
+        finally:
+            # the consumer stopped early or the iteration finished, discard volumes not yet started
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,26 @@
+from auxiliary._lazy import lazy_attributes
+
+__getattr__, __dir__, __all__ = lazy_attributes(
+    __name__,
+    submodules=[
+        "functional",
+        "normalizer_base",
+        "percentile_normalizer",
+        "pipeline",
+        "quantile_sketch",
+        "windowing_normalizer",
+    ],
+    attributes={
+        "ElementwiseTransform": ".normalizer_base",
+        "NormalizationPipeline": ".pipeline",
+        "Normalizer": ".normalizer_base",
+        "PercentileNormalizer": ".percentile_normalizer",
+        "QuantileSketch": ".quantile_sketch",
+        "WINDOW_PRESETS": ".windowing_normalizer",
+        "WindowingNormalizer": ".windowing_normalizer",
+        "apply_windows": ".windowing_normalizer",
+        "compute_percentiles": ".percentile_normalizer",
+        "normalize_with_percentiles": ".functional",
+        "normalize_with_windowing": ".functional",
+    },
+)
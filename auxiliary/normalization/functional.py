@@ -1,7 +1,10 @@
 from .percentile_normalizer import PercentileNormalizer
 from .windowing_normalizer import WindowingNormalizer
 
+from typing import Optional
+
 import numpy as np
+from numpy.typing import DTypeLike
 
 
 def normalize_with_percentiles(
@@ -10,6 +13,8 @@ def normalize_with_percentiles(
     upper_percentile: float = 100.0,
     lower_limit: float = 0,
     upper_limit: float = 1,
+    dtype: Optional[DTypeLike] = None,
+    out: Optional[np.ndarray] = None,
 ):
     """
     Normalize an input image using percentile-based normalization.
@@ -20,6 +25,8 @@ def normalize_with_percentiles(
         upper_percentile (float): The upper percentile for mapping.
         lower_limit (float): The lower limit for normalized values.
         upper_limit (float): The upper limit for normalized values.
+        dtype (DTypeLike, optional): The dtype of the normalized image, e.g. np.float32; integer results are rounded.
+        out (numpy.ndarray, optional): A preallocated array to write the normalized image into.
 
     Returns:
         numpy.ndarray: The normalized image.
@@ -30,7 +37,7 @@ def normalize_with_percentiles(
     )
 
     # Call the normalize method of the normalizer instance
-    normalized_image = normalizer.normalize(image)
+    normalized_image = normalizer.normalize(image, dtype=dtype, out=out)
 
     return normalized_image
 
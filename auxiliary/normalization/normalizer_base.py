@@ -1,9 +1,201 @@
+import copy
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+from numpy.typing import DTypeLike
+
+from auxiliary.instrumentation import instrument
+
+
+def iter_chunks(image, chunk_size: int) -> Iterator[Tuple[slice, np.ndarray]]:
+    """
+    Iterate over slabs along the first axis of an array-like, loading one slab at a time.
+
+    Parameters:
+        image (array_like): The input image, e.g. a np.memmap or any object supporting shape and slicing.
+        chunk_size (int): The approximate number of voxels per slab; a slab contains at least one index of the first axis.
+
+    Yields:
+        Tuple[slice, numpy.ndarray]: The slice along the first axis and the loaded slab.
+    """
+    shape = image.shape
+    voxels_per_index = int(np.prod(shape[1:], dtype=np.int64))
+    step = max(1, chunk_size // max(voxels_per_index, 1))
+    for start in range(0, shape[0], step):
+        index = slice(start, min(start + step, shape[0]))
+        yield index, np.asarray(image[index])
+
+
+# number of voxels per block processed by ElementwiseTransform.apply, small enough to stay in the CPU cache
+_APPLY_BLOCK_SIZE = 2**16
+
+
+def default_output_dtype(
+    image: np.ndarray, out: Optional[np.ndarray] = None
+) -> np.dtype:
+    """
+    Return the dtype of `out` if given, the dtype of floating point images, or float64 otherwise.
+    """
+    if out is not None:
+        return out.dtype
+    if np.issubdtype(image.dtype, np.floating):
+        return image.dtype
+    return np.dtype(np.float64)
+
+
+class ElementwiseTransform(NamedTuple):
+    """
+    An element-wise intensity mapping ``clip(scale * x + offset, lower, upper)``.
+
+    Chains of such mappings, e.g. windowing followed by a rescale, compose into a single one with `then`,
+    so that they are applied in one pass over memory.
+
+    Attributes:
+        scale (float): The factor applied first.
+        offset (float): The offset added after scaling.
+        lower (float): The lower clipping bound, -inf for none.
+        upper (float): The upper clipping bound, inf for none.
+    """
+
+    scale: float = 1.0
+    offset: float = 0.0
+    lower: float = -np.inf
+    upper: float = np.inf
+
+    def is_identity(self) -> bool:
+        """
+        Return whether the transform leaves all values unchanged.
+        """
+        return self == ElementwiseTransform()
+
+    def then(self, other: "ElementwiseTransform") -> "ElementwiseTransform":
+        """
+        Compose with a transform applied after this one.
+
+        Parameters:
+            other (ElementwiseTransform): The transform applied to the output of this one.
+
+        Returns:
+            ElementwiseTransform: The composed transform.
+        """
+        if other.scale == 0:
+            return ElementwiseTransform(
+                0.0, float(np.clip(other.offset, other.lower, other.upper))
+            )
+        # scaling the clipping bounds of this transform moves them behind the new scale and offset
+        bounds = sorted(
+            (
+                other.scale * self.lower + other.offset,
+                other.scale * self.upper + other.offset,
+            )
+        )
+        lower = max(bounds[0], other.lower)
+        upper = min(bounds[1], other.upper)
+        if lower > upper:
+            # the clipping ranges do not overlap, all values end up on one bound of the other transform
+            constant = other.lower if bounds[1] < other.lower else other.upper
+            return ElementwiseTransform(0.0, float(constant))
+        return ElementwiseTransform(
+            other.scale * self.scale,
+            other.scale * self.offset + other.offset,
+            lower,
+            upper,
+        )
+
+    def __call__(self, values) -> np.ndarray:
+        """
+        Apply the transform to a few values in float64, e.g. to percentiles.
+        """
+        return np.clip(
+            self.scale * np.asarray(values, dtype=np.float64) + self.offset,
+            self.lower,
+            self.upper,
+        )
+
+    def apply(
+        self,
+        image: np.ndarray,
+        dtype: Optional[DTypeLike] = None,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Apply the transform in a single pass over memory, processing cache-sized blocks.
+
+        Parameters:
+            image (numpy.ndarray): The input image.
+            dtype (DTypeLike, optional): The dtype of the result; integer results are rounded.
+                Defaults to the dtype of `out`, the dtype of floating point images, or float64 otherwise.
+            out (numpy.ndarray, optional): A preallocated array with the shape of the image to write the result into.
+                May be the input image itself for an in-place transform.
+
+        Returns:
+            numpy.ndarray: The transformed image.
+        """
+        image = np.asarray(image)
+        dtype = (
+            np.dtype(dtype) if dtype is not None else default_output_dtype(image, out)
+        )
+        if out is None:
+            out = np.empty(image.shape, dtype=dtype)
+        elif out.shape != image.shape:
+            raise ValueError(
+                f"Output shape {out.shape} does not match image shape {image.shape}."
+            )
+        if not out.flags.c_contiguous:
+            out[...] = self.apply(image, dtype=dtype)
+            return out
+
+        is_integer = np.issubdtype(dtype, np.integer)
+        # the blocks are computed in float64 and only the result is cast: in float32, `scale * x + offset`
+        # cancels catastrophically when the values are large relative to their range
+        working_dtype = np.dtype(np.float64)
+        lower, upper = self.lower, self.upper
+        if is_integer:
+            # keep the rounded values within the range of the output dtype
+            info = np.iinfo(dtype)
+            lower, upper = max(lower, info.min), min(upper, info.max)
+        clip = np.isfinite(lower) or np.isfinite(upper)
+        scale = working_dtype.type(self.scale)
+        offset = working_dtype.type(self.offset)
+
+        flat_image = image.reshape(-1)
+        flat_out = out.reshape(-1)
+        buffer = np.empty(min(_APPLY_BLOCK_SIZE, flat_image.size), dtype=working_dtype)
+        for start in range(0, flat_image.size, _APPLY_BLOCK_SIZE):
+            block = flat_image[start : start + _APPLY_BLOCK_SIZE]
+            result = buffer[: block.size]
+            np.multiply(block, scale, out=result, dtype=working_dtype, casting="unsafe")
+            if self.offset != 0:
+                np.add(result, offset, out=result)
+            if clip:
+                np.clip(result, lower, upper, out=result)
+            if is_integer:
+                np.rint(result, out=result)
+            flat_out[start : start + block.size] = result
+        return out
 
 
 class Normalizer(ABC):
     """
     Abstract base class for image normalization methods.
+
+    Besides normalizing each image on its own via `normalize`, normalizers follow a fit/transform protocol:
+    `fit`/`partial_fit` gather statistics over a cohort of images, `transform` applies the fitted mapping,
+    and `save`/`load` persist the fitted state. Normalizers without statistics need no fitting and
+    `transform` is equivalent to `normalize`.
     """
 
     def __init__(self):
@@ -21,3 +213,194 @@ class Normalizer(ABC):
             numpy.ndarray: The normalized image.
         """
         pass
+
+    def reset(self) -> None:
+        """
+        Discard any fitted state.
+        """
+        pass
+
+    def partial_fit(self, image) -> "Normalizer":
+        """
+        Update the fitted state with a single image.
+
+        Parameters:
+            image (numpy.ndarray): The input image.
+
+        Returns:
+            Normalizer: The normalizer itself.
+        """
+        return self
+
+    def fit(self, images: Iterable) -> "Normalizer":
+        """
+        Fit the normalizer on a cohort of images, discarding any previously fitted state.
+
+        Parameters:
+            images (Iterable[numpy.ndarray]): The input images, e.g. a generator that loads them one by one.
+
+        Returns:
+            Normalizer: The normalizer itself.
+        """
+        self.reset()
+        for image in images:
+            self.partial_fit(image)
+        return self
+
+    def transform(self, image):
+        """
+        Normalize the input image using the fitted state.
+
+        Parameters:
+            image (numpy.ndarray): The input image.
+
+        Returns:
+            numpy.ndarray: The normalized image.
+        """
+        return self.normalize(image)
+
+    def elementwise_transform(
+        self,
+        image: np.ndarray,
+        prior: ElementwiseTransform = ElementwiseTransform(),
+        fitted: bool = False,
+    ) -> Optional[ElementwiseTransform]:
+        """
+        Express the normalization as an element-wise transform, so that it can be fused with neighbouring steps,
+        e.g. by a `NormalizationPipeline`.
+
+        Parameters:
+            image (numpy.ndarray): The image the pipeline started from.
+            prior (ElementwiseTransform): The transform applied to `image` by the preceding steps;
+                the input of this normalizer is `prior.apply(image)`.
+            fitted (bool): If True, describe `transform` with the fitted state, otherwise `normalize`.
+
+        Returns:
+            Optional[ElementwiseTransform]: The transform, or None if the normalization is not element-wise.
+        """
+        return None
+
+    @instrument(array="images")
+    def normalize_batch(
+        self,
+        images: Union[np.ndarray, Sequence[np.ndarray]],
+        axis: int = 0,
+        num_workers: Optional[int] = None,
+    ) -> Union[np.ndarray, List[np.ndarray]]:
+        """
+        Normalize a batch of images or the channels of a stacked image, each with its own statistics.
+
+        Items are normalized concurrently on a thread pool; the NumPy kernels release the GIL,
+        so all cores are used. Results of a stacked input are written into a single preallocated output.
+
+        Parameters:
+            images (Union[numpy.ndarray, Sequence[numpy.ndarray]]): A stacked array, e.g. T1, T1c, T2 and FLAIR
+                channels, or a list of arrays.
+            axis (int): The axis of a stacked array along which the items are stored. Defaults to 0.
+            num_workers (int, optional): Number of threads. Defaults to the number of processors.
+
+        Raises:
+            ValueError: If a stacked array holds no items along `axis`, as the output dtype is then unknown.
+
+        Returns:
+            Union[numpy.ndarray, List[numpy.ndarray]]: The normalized stacked array or list of arrays.
+        """
+        if isinstance(images, np.ndarray) and images.shape[axis] == 0:
+            raise ValueError(
+                f"Cannot normalize a stacked array without items along axis {axis}, got shape {images.shape}."
+            )
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            if not isinstance(images, np.ndarray):
+                return list(executor.map(self.normalize, images))
+
+            items = np.moveaxis(images, axis, 0)
+            # the first item determines the output dtype
+            first = self.normalize(items[0])
+            out = np.empty(items.shape, dtype=first.dtype)
+            out[0] = first
+
+            def _normalize_item(index: int) -> None:
+                out[index] = self.normalize(items[index])
+
+            list(executor.map(_normalize_item, range(1, len(items))))
+        return np.moveaxis(out, 0, axis)
+
+    @instrument(array="image")
+    def normalize_chunked(
+        self,
+        image,
+        out=None,
+        output_path: Optional[Union[Path, str]] = None,
+        dtype: DTypeLike = np.float32,
+        chunk_size: int = 2**24,
+    ):
+        """
+        Normalize an image that does not fit into memory, processing it slab by slab along the first axis.
+
+        Statistics are gathered in a first streaming pass with `fit`; percentiles are therefore
+        approximated by a quantile sketch. The image is then transformed in a second pass and written
+        chunk by chunk into the output, so peak memory depends on `chunk_size` and not on the volume size.
+        The fitted state of the normalizer itself is left untouched.
+
+        Parameters:
+            image (array_like): The input image, e.g. a np.memmap or any object supporting shape and slicing.
+            out (array_like, optional): A writable array with the shape of the image, e.g. a np.memmap.
+            output_path (Union[Path, str], optional): If `out` is not given, path of a .npy file that is created
+                as a memory-mapped output. If neither is given, the output is allocated in memory.
+            dtype (DTypeLike): The dtype of a newly created output. Defaults to np.float32.
+            chunk_size (int): The approximate number of voxels processed at once. Defaults to 2**24.
+
+        Returns:
+            array_like: The normalized image.
+        """
+        if out is None:
+            if output_path is not None:
+                out = np.lib.format.open_memmap(
+                    output_path, mode="w+", dtype=dtype, shape=image.shape
+                )
+            else:
+                out = np.empty(image.shape, dtype=dtype)
+
+        fitted = copy.deepcopy(self)
+        fitted.fit(chunk for _, chunk in iter_chunks(image, chunk_size))
+        for index, chunk in iter_chunks(image, chunk_size):
+            out[index] = fitted.transform(chunk)
+
+        if hasattr(out, "flush"):
+            out.flush()
+        return out
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        """
+        Return the parameters and fitted state as a dictionary of NumPy arrays.
+        """
+        return {}
+
+    def load_state_dict(self, state: Dict[str, np.ndarray]) -> None:
+        """
+        Restore the parameters and fitted state from a dictionary created by `state_dict`.
+        """
+        pass
+
+    def save(self, path: Union[Path, str]) -> None:
+        """
+        Save the parameters and fitted state to a .npz file.
+
+        Parameters:
+            path (Union[Path, str]): Path of the output file.
+        """
+        np.savez(path, **self.state_dict())
+
+    def load(self, path: Union[Path, str]) -> "Normalizer":
+        """
+        Load the parameters and fitted state from a .npz file created by `save`.
+
+        Parameters:
+            path (Union[Path, str]): Path of the input file.
+
+        Returns:
+            Normalizer: The normalizer itself.
+        """
+        with np.load(path) as data:
+            self.load_state_dict(dict(data))
+        return self
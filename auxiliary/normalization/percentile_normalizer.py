@@ -1,5 +1,105 @@
+from typing import Dict, Optional, Sequence
+
 import numpy as np
-from .normalizer_base import Normalizer
+from numpy.typing import DTypeLike
+
+from auxiliary.instrumentation import instrument
+from .normalizer_base import ElementwiseTransform, Normalizer
+from .quantile_sketch import QuantileSketch
+
+# number of voxels that are histogrammed at once by the integer fast path
+_BINCOUNT_CHUNK_SIZE = 2**22
+
+
+def _integer_order_statistics(image: np.ndarray, ranks: np.ndarray) -> np.ndarray:
+    """
+    Return the k-th smallest values of an 8 or 16 bit integer image for several ranks k, from its histogram in O(n).
+
+    Parameters:
+        image (numpy.ndarray): The input image with an integer dtype of at most 16 bit.
+        ranks (numpy.ndarray): The zero-based ranks.
+
+    Returns:
+        numpy.ndarray: The values as int64.
+    """
+    info = np.iinfo(image.dtype)
+    flat = image.reshape(-1)
+    counts = np.zeros(info.max - info.min + 1, dtype=np.int64)
+    # chunking bounds the intp temporaries that bincount requires
+    for start in range(0, flat.size, _BINCOUNT_CHUNK_SIZE):
+        chunk = flat[start : start + _BINCOUNT_CHUNK_SIZE]
+        counts += np.bincount(
+            np.subtract(chunk, info.min, dtype=np.intp), minlength=counts.size
+        )
+    cumulative = np.cumsum(counts)
+    # the k-th smallest value is the first bin whose cumulative count exceeds k
+    return np.searchsorted(cumulative, ranks, side="right") + info.min
+
+
+def _is_small_integer(image: np.ndarray) -> bool:
+    return image.dtype.kind in "iu" and image.dtype.itemsize <= 2 and image.size > 0
+
+
+def compute_percentiles(
+    image: np.ndarray,
+    percentiles: Sequence[float],
+    transform: Optional[ElementwiseTransform] = None,
+):
+    """
+    Compute several percentiles of an image in a single pass.
+
+    8 and 16 bit integer images (e.g. int16 CT/MR) use an exact histogram-based fast path,
+    all other images a single call to ``np.percentile``.
+
+    Parameters:
+        image (numpy.ndarray): The input image.
+        percentiles (Sequence[float]): The percentiles to compute, in the range [0, 100].
+        transform (ElementwiseTransform, optional): If given, compute the percentiles of `transform.apply(image)`
+            without materializing it. Element-wise transforms are monotone, so they map the order statistics
+            of the image onto those of the transformed image.
+
+    Returns:
+        numpy.ndarray: The percentile values.
+    """
+    image = np.asarray(image)
+    small_integer = _is_small_integer(image)
+    if transform is None and not small_integer:
+        return np.percentile(image, percentiles)
+
+    size = image.size
+    ranks = np.asarray(percentiles, dtype=np.float64) / 100 * (size - 1)
+    lower_ranks = np.floor(ranks)
+    fraction = ranks - lower_ranks
+    upper_ranks = np.minimum(lower_ranks + 1, size - 1)
+    if transform is not None and transform.scale < 0:
+        # a decreasing transform reverses the order of the values
+        lower_ranks, upper_ranks = size - 1 - lower_ranks, size - 1 - upper_ranks
+
+    if small_integer:
+        values = _integer_order_statistics(
+            image, np.concatenate([lower_ranks, upper_ranks])
+        )
+        lower_values, upper_values = np.split(values, 2)
+    else:
+        lower_indices = lower_ranks.astype(np.intp)
+        upper_indices = upper_ranks.astype(np.intp)
+        partitioned = np.partition(
+            image.reshape(-1), np.unique(np.concatenate([lower_indices, upper_indices]))
+        )
+        lower_values = partitioned[lower_indices]
+        upper_values = partitioned[upper_indices]
+    if transform is not None:
+        lower_values, upper_values = transform(lower_values), transform(upper_values)
+
+    # same interpolation formula as np.percentile for bit-identical results
+    lower_values = np.asarray(lower_values, dtype=np.float64)
+    upper_values = np.asarray(upper_values, dtype=np.float64)
+    difference = upper_values - lower_values
+    return np.where(
+        fraction >= 0.5,
+        upper_values - difference * (1 - fraction),
+        lower_values + difference * fraction,
+    )
 
 
 class PercentileNormalizer(Normalizer):
@@ -13,6 +113,7 @@ class PercentileNormalizer(Normalizer):
         upper_percentile: float = 100.0,
         lower_limit: float = 0,
         upper_limit: float = 1,
+        sketch_size: int = 2048,
     ):
         """
         Initialize the PercentileNormalizer.
@@ -22,29 +123,198 @@ class PercentileNormalizer(Normalizer):
             upper_percentile (float): The upper percentile for mapping.
             lower_limit (float): The lower limit for normalized values.
             upper_limit (float): The upper limit for normalized values.
+            sketch_size (int): Size parameter `k` of the quantile sketch used by `fit`/`partial_fit`.
         """
         super().__init__()
         self.lower_percentile = lower_percentile
         self.upper_percentile = upper_percentile
         self.lower_limit = lower_limit
         self.upper_limit = upper_limit
+        self.sketch_size = sketch_size
+        self.sketch: Optional[QuantileSketch] = None
 
-    def normalize(self, image: np.ndarray):
+    @instrument(array="image")
+    def normalize(
+        self,
+        image: np.ndarray,
+        dtype: Optional[DTypeLike] = None,
+        out: Optional[np.ndarray] = None,
+    ):
         """
         Normalize the input image using percentile-based mapping.
 
         Parameters:
             image (numpy.ndarray): The input image.
+            dtype (DTypeLike, optional): The dtype of the result, e.g. np.float32; integer results are rounded.
+                Defaults to the dtype of `out`, the dtype of floating point images, or float64 otherwise.
+            out (numpy.ndarray, optional): A preallocated array with the shape of the image to write the result into.
 
         Returns:
             numpy.ndarray: The percentile-normalized image.
         """
-        lower_value = np.percentile(image, self.lower_percentile)
-        upper_value = np.percentile(image, self.upper_percentile)
-        normalized_image = np.clip(
-            (image - lower_value) / (upper_value - lower_value), 0, 1
+        lower_value, upper_value = compute_percentiles(
+            image, [self.lower_percentile, self.upper_percentile]
         )
-        normalized_image = (
-            normalized_image * (self.upper_limit - self.lower_limit) + self.lower_limit
+        return self._rescale(image, lower_value, upper_value, dtype=dtype, out=out)
+
+    def reset(self) -> None:
+        """
+        Discard the fitted quantile sketch.
+        """
+        self.sketch = None
+
+    def partial_fit(self, image: np.ndarray) -> "PercentileNormalizer":
+        """
+        Add the intensities of an image to the cohort-level quantile sketch.
+
+        Parameters:
+            image (numpy.ndarray): The input image.
+
+        Returns:
+            PercentileNormalizer: The normalizer itself.
+        """
+        if self.sketch is None:
+            self.sketch = QuantileSketch(k=self.sketch_size)
+        self.sketch.update(image)
+        return self
+
+    def merge(self, other: "PercentileNormalizer") -> "PercentileNormalizer":
+        """
+        Merge the fitted state of another normalizer, e.g. one fitted by a parallel worker.
+
+        Parameters:
+            other (PercentileNormalizer): The normalizer to merge.
+
+        Returns:
+            PercentileNormalizer: The normalizer itself.
+        """
+        if other.sketch is not None:
+            if self.sketch is None:
+                self.sketch = QuantileSketch(k=self.sketch_size)
+            self.sketch.merge(other.sketch)
+        return self
+
+    def fitted_bounds(self):
+        """
+        Return the cohort-level intensities at the lower and upper percentile.
+
+        Returns:
+            numpy.ndarray: The lower and upper value.
+
+        Raises:
+            RuntimeError: If the normalizer has not been fitted.
+        """
+        if self.sketch is None:
+            raise RuntimeError(
+                "PercentileNormalizer must be fitted with fit or partial_fit before calling transform."
+            )
+        return self.sketch.quantile(
+            [self.lower_percentile / 100, self.upper_percentile / 100]
+        )
+
+    @instrument(array="image")
+    def transform(
+        self,
+        image: np.ndarray,
+        dtype: Optional[DTypeLike] = None,
+        out: Optional[np.ndarray] = None,
+    ):
+        """
+        Normalize the input image using the percentiles fitted on the cohort.
+
+        Parameters:
+            image (numpy.ndarray): The input image.
+            dtype (DTypeLike, optional): The floating point dtype of the result, see `normalize`.
+            out (numpy.ndarray, optional): A preallocated array with the shape of the image to write the result into.
+
+        Returns:
+            numpy.ndarray: The percentile-normalized image.
+        """
+        lower_value, upper_value = self.fitted_bounds()
+        return self._rescale(image, lower_value, upper_value, dtype=dtype, out=out)
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        """
+        Return the parameters and the fitted quantile sketch as a dictionary of NumPy arrays.
+        """
+        state = {
+            "lower_percentile": np.asarray(self.lower_percentile),
+            "upper_percentile": np.asarray(self.upper_percentile),
+            "lower_limit": np.asarray(self.lower_limit),
+            "upper_limit": np.asarray(self.upper_limit),
+            "sketch_size": np.asarray(self.sketch_size),
+        }
+        if self.sketch is not None:
+            state.update(
+                {f"sketch_{k}": v for k, v in self.sketch.state_dict().items()}
+            )
+        return state
+
+    def load_state_dict(self, state: Dict[str, np.ndarray]) -> None:
+        """
+        Restore the parameters and the fitted quantile sketch from a dictionary created by `state_dict`.
+        """
+        self.lower_percentile = float(state["lower_percentile"])
+        self.upper_percentile = float(state["upper_percentile"])
+        self.lower_limit = float(state["lower_limit"])
+        self.upper_limit = float(state["upper_limit"])
+        self.sketch_size = int(state["sketch_size"])
+        sketch_state = {
+            k[len("sketch_") :]: v
+            for k, v in state.items()
+            if k.startswith("sketch_") and k != "sketch_size"
+        }
+        self.sketch = (
+            QuantileSketch.from_state_dict(sketch_state) if sketch_state else None
+        )
+
+    def elementwise_transform(
+        self,
+        image: np.ndarray,
+        prior: ElementwiseTransform = ElementwiseTransform(),
+        fitted: bool = False,
+    ) -> ElementwiseTransform:
+        """
+        Express the normalization as an element-wise transform, see `Normalizer.elementwise_transform`.
+        The percentiles of the output of the preceding steps are computed without materializing it.
+        """
+        if fitted:
+            lower_value, upper_value = self.fitted_bounds()
+        else:
+            lower_value, upper_value = compute_percentiles(
+                image,
+                [self.lower_percentile, self.upper_percentile],
+                transform=None if prior.is_identity() else prior,
+            )
+        return self._bounds_transform(lower_value, upper_value)
+
+    def _bounds_transform(
+        self, lower_value: float, upper_value: float
+    ) -> ElementwiseTransform:
+        """
+        Map [lower_value, upper_value] to [lower_limit, upper_limit] and clip.
+        """
+        scale = np.float64(self.upper_limit - self.lower_limit) / np.float64(
+            upper_value - lower_value
+        )
+        return ElementwiseTransform(
+            float(scale),
+            float(self.lower_limit - lower_value * scale),
+            min(self.lower_limit, self.upper_limit),
+            max(self.lower_limit, self.upper_limit),
+        )
+
+    def _rescale(
+        self,
+        image: np.ndarray,
+        lower_value: float,
+        upper_value: float,
+        dtype: Optional[DTypeLike] = None,
+        out: Optional[np.ndarray] = None,
+    ):
+        """
+        Map [lower_value, upper_value] to [lower_limit, upper_limit] and clip, in a single pass over memory.
+        """
+        return self._bounds_transform(lower_value, upper_value).apply(
+            image, dtype=dtype, out=out
         )
-        return normalized_image
@@ -0,0 +1,151 @@
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from numpy.typing import DTypeLike
+
+from auxiliary.instrumentation import instrument
+from .normalizer_base import ElementwiseTransform, Normalizer, default_output_dtype
+
+
+class NormalizationPipeline(Normalizer):
+    """
+    Normalizer chaining several normalizers, e.g. windowing followed by a percentile rescale.
+
+    Consecutive element-wise steps (clip, shift, scale) are fused into a single transform that is applied
+    in one pass over memory, directly into the output buffer, so no full-size intermediate is created.
+    Statistics that a step needs from its input, e.g. percentiles, are computed from the pipeline input.
+    Steps that are not element-wise are applied on their own, fusing the steps before and after them.
+    """
+
+    def __init__(self, steps: Sequence[Normalizer]):
+        """
+        Initialize the NormalizationPipeline.
+
+        Parameters:
+            steps (Sequence[Normalizer]): The normalizers, applied in order.
+        """
+        super().__init__()
+        self.steps = list(steps)
+
+    def _run(
+        self,
+        image: np.ndarray,
+        fitted: bool,
+        dtype: Optional[DTypeLike],
+        out: Optional[np.ndarray],
+    ) -> np.ndarray:
+        image = np.asarray(image)
+        dtype = (
+            np.dtype(dtype) if dtype is not None else default_output_dtype(image, out)
+        )
+        pending = ElementwiseTransform()
+        for step in self.steps:
+            transform = step.elementwise_transform(image, pending, fitted=fitted)
+            if transform is not None:
+                pending = pending.then(transform)
+                continue
+            # materialize the fused steps so far for a step that is not element-wise
+            if not pending.is_identity():
+                image = pending.apply(image)
+                pending = ElementwiseTransform()
+            image = step.transform(image) if fitted else step.normalize(image)
+        return pending.apply(image, dtype=dtype, out=out)
+
+    @instrument(array="image")
+    def normalize(
+        self,
+        image: np.ndarray,
+        dtype: Optional[DTypeLike] = None,
+        out: Optional[np.ndarray] = None,
+    ):
+        """
+        Normalize the input image with all steps, each based on its own input.
+
+        Parameters:
+            image (numpy.ndarray): The input image.
+            dtype (DTypeLike, optional): The dtype of the result, e.g. np.float32 or np.uint8; integer results are rounded.
+                Defaults to the dtype of `out`, the dtype of floating point images, or float64 otherwise.
+            out (numpy.ndarray, optional): A preallocated array with the shape of the image to write the result into.
+                May be the input image itself to normalize a floating point image in place.
+
+        Returns:
+            numpy.ndarray: The normalized image.
+        """
+        return self._run(image, fitted=False, dtype=dtype, out=out)
+
+    @instrument(array="image")
+    def transform(
+        self,
+        image: np.ndarray,
+        dtype: Optional[DTypeLike] = None,
+        out: Optional[np.ndarray] = None,
+    ):
+        """
+        Normalize the input image with the fitted state of all steps.
+
+        Parameters:
+            image (numpy.ndarray): The input image.
+            dtype (DTypeLike, optional): The dtype of the result, see `normalize`.
+            out (numpy.ndarray, optional): A preallocated array with the shape of the image to write the result into.
+
+        Returns:
+            numpy.ndarray: The normalized image.
+        """
+        return self._run(image, fitted=True, dtype=dtype, out=out)
+
+    def reset(self) -> None:
+        """
+        Discard the fitted state of all steps.
+        """
+        for step in self.steps:
+            step.reset()
+
+    def partial_fit(self, image: np.ndarray) -> "NormalizationPipeline":
+        """
+        Update the fitted state of each step with its input, the output of the fitted preceding steps.
+
+        Parameters:
+            image (numpy.ndarray): The input image.
+
+        Returns:
+            NormalizationPipeline: The pipeline itself.
+        """
+        image = np.asarray(image)
+        pending = ElementwiseTransform()
+        for step in self.steps:
+            if type(step).partial_fit is not Normalizer.partial_fit:
+                # only steps with a fitted state need their input materialized
+                step.partial_fit(
+                    image if pending.is_identity() else pending.apply(image)
+                )
+            transform = step.elementwise_transform(image, pending, fitted=True)
+            if transform is not None:
+                pending = pending.then(transform)
+            else:
+                image = step.transform(pending.apply(image))
+                pending = ElementwiseTransform()
+        return self
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        """
+        Return the state of all steps, with keys prefixed by the step index, e.g. "0.center".
+        """
+        return {
+            f"{index}.{key}": value
+            for index, step in enumerate(self.steps)
+            for key, value in step.state_dict().items()
+        }
+
+    def load_state_dict(self, state: Dict[str, np.ndarray]) -> None:
+        """
+        Restore the state of all steps from a dictionary created by `state_dict`.
+        """
+        for index, step in enumerate(self.steps):
+            prefix = f"{index}."
+            step.load_state_dict(
+                {
+                    key[len(prefix) :]: value
+                    for key, value in state.items()
+                    if key.startswith(prefix)
+                }
+            )
@@ -0,0 +1,158 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# number of values that are cast to float64 and compacted at once
+_UPDATE_CHUNK_SIZE = 2**20
+
+
+class QuantileSketch:
+    """
+    Mergeable streaming quantile sketch (KLL) with bounded memory.
+
+    The sketch keeps a hierarchy of compactors: items on level ``h`` represent ``2**h`` input values.
+    Whenever a level overflows its capacity, it is sorted and every other item is promoted to the next level.
+    Memory is O(k log(n / k)) and the rank error is roughly 1.7 / k, independent of the number of values.
+    Sketches built in parallel workers can be combined with :meth:`merge`.
+    """
+
+    def __init__(self, k: int = 2048, seed: Optional[int] = None):
+        """
+        Initialize the QuantileSketch.
+
+        Parameters:
+            k (int): Capacity of the top compactor; larger values are more accurate and use more memory.
+            seed (int, optional): Seed for the random compaction offsets.
+        """
+        self.k = k
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self._levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self._levels):
+            items = self._levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                items = np.sort(items)
+                # an odd item out stays on its level so that the total weight is preserved
+                if len(items) % 2:
+                    self._levels[level] = items[-1:]
+                    items = items[:-1]
+                else:
+                    self._levels[level] = np.empty(0)
+                promoted = items[self._rng.integers(2) :: 2]
+                self._levels[level + 1] = np.concatenate(
+                    [self._levels[level + 1], promoted]
+                )
+            level += 1
+
+    def update(self, values) -> "QuantileSketch":
+        """
+        Add values to the sketch.
+
+        Parameters:
+            values (array_like): The values to add, e.g. an image. NaN values are ignored.
+
+        Returns:
+            QuantileSketch: The sketch itself.
+        """
+        flat = np.asarray(values).reshape(-1)
+        for start in range(0, flat.size, _UPDATE_CHUNK_SIZE):
+            chunk = flat[start : start + _UPDATE_CHUNK_SIZE].astype(np.float64)
+            chunk = chunk[~np.isnan(chunk)]
+            if chunk.size == 0:
+                continue
+            self.count += chunk.size
+            self.min = min(self.min, chunk.min())
+            self.max = max(self.max, chunk.max())
+            self._levels[0] = np.concatenate([self._levels[0], chunk])
+            self._compress()
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """
+        Merge another sketch into this one, e.g. a sketch computed by a parallel worker.
+
+        Parameters:
+            other (QuantileSketch): The sketch to merge.
+
+        Returns:
+            QuantileSketch: The sketch itself.
+        """
+        while len(self._levels) < len(other._levels):
+            self._levels.append(np.empty(0))
+        for level, items in enumerate(other._levels):
+            self._levels[level] = np.concatenate([self._levels[level], items])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantile(self, quantiles: Sequence[float]) -> np.ndarray:
+        """
+        Estimate quantiles of all values added so far.
+
+        Parameters:
+            quantiles (Sequence[float]): The quantiles to estimate, in the range [0, 1].
+
+        Returns:
+            numpy.ndarray: The estimated quantile values.
+
+        Raises:
+            RuntimeError: If the sketch is empty.
+        """
+        if self.count == 0:
+            raise RuntimeError("Cannot compute quantiles of an empty sketch.")
+        items = np.concatenate(self._levels)
+        weights = np.concatenate(
+            [np.full(len(items), 2**level) for level, items in enumerate(self._levels)]
+        )
+        order = np.argsort(items, kind="stable")
+        items = items[order]
+        cumulative = np.cumsum(weights[order])
+
+        quantiles = np.asarray(quantiles, dtype=np.float64)
+        index = np.searchsorted(cumulative, quantiles * cumulative[-1], side="left")
+        values = items[np.minimum(index, len(items) - 1)]
+        # the extremes are tracked exactly
+        values = np.where(quantiles <= 0, self.min, values)
+        values = np.where(quantiles >= 1, self.max, values)
+        return values
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        """
+        Return the state of the sketch as a dictionary of NumPy arrays, e.g. for `np.savez`.
+        """
+        return {
+            "k": np.asarray(self.k),
+            "count": np.asarray(self.count),
+            "min": np.asarray(self.min),
+            "max": np.asarray(self.max),
+            "items": np.concatenate(self._levels),
+            "level_sizes": np.asarray([len(items) for items in self._levels]),
+        }
+
+    @classmethod
+    def from_state_dict(
+        cls, state: Dict[str, np.ndarray], seed: Optional[int] = None
+    ) -> "QuantileSketch":
+        """
+        Restore a sketch from a dictionary created by :meth:`state_dict`.
+        """
+        sketch = cls(k=int(state["k"]), seed=seed)
+        sketch.count = int(state["count"])
+        sketch.min = float(state["min"])
+        sketch.max = float(state["max"])
+        boundaries = np.cumsum(state["level_sizes"])[:-1]
+        sketch._levels = list(np.split(np.asarray(state["items"]), boundaries))
+        return sketch
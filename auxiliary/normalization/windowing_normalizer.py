@@ -1,5 +1,180 @@
+from functools import lru_cache
+from typing import Dict, Optional, Sequence, Tuple, Union
+
 import numpy as np
-from .normalizer_base import Normalizer
+from numpy.typing import DTypeLike
+
+from auxiliary.instrumentation import instrument
+from .normalizer_base import ElementwiseTransform, Normalizer
+
+# common CT windows in Hounsfield units as (center, width)
+WINDOW_PRESETS: Dict[str, Tuple[float, float]] = {
+    "brain": (40, 80),
+    "subdural": (75, 215),
+    "stroke": (40, 40),
+    "soft_tissue": (50, 350),
+    "bone": (400, 1800),
+    "lung": (-600, 1500),
+}
+
+# number of voxels per block looked up at once, small enough for the index temporaries to stay in the CPU cache
+_LOOKUP_BLOCK_SIZE = 2**16
+# largest lookup table, the tables of 8 and 16 bit dtypes; larger value ranges, e.g. outliers in int32 images,
+# would make tables that neither stay in the CPU cache nor are cheap to keep in the table cache
+_MAX_TABLE_SIZE = 2**16
+
+
+def _window_transform(
+    center: float, width: float, lower_limit: float, upper_limit: float
+) -> ElementwiseTransform:
+    """
+    Map the window [center - width / 2, center + width / 2] to [lower_limit, upper_limit] and clip.
+    """
+    scale = (upper_limit - lower_limit) / width
+    return ElementwiseTransform(
+        scale,
+        lower_limit - (center - width / 2) * scale,
+        min(lower_limit, upper_limit),
+        max(lower_limit, upper_limit),
+    )
+
+
+@lru_cache(maxsize=64)
+def _lookup_table(
+    center: float,
+    width: float,
+    lower_limit: float,
+    upper_limit: float,
+    input_dtype: str,
+    dtype: str,
+    value_range: Optional[Tuple[int, int]],
+) -> np.ndarray:
+    """
+    Build a read-only lookup table of a window for all values of an integer dtype or of a value range.
+    Without a value range, the table is indexed by the unsigned bit pattern of the values.
+    """
+    if value_range is None:
+        itemsize = np.dtype(input_dtype).itemsize
+        values = np.arange(2 ** (8 * itemsize), dtype=f"u{itemsize}").view(input_dtype)
+    else:
+        values = np.arange(value_range[0], value_range[1] + 1)
+    table = _window_transform(center, width, lower_limit, upper_limit).apply(
+        values, dtype=dtype
+    )
+    table.flags.writeable = False
+    return table
+
+
+def apply_windows(
+    image: np.ndarray,
+    windows: Sequence[Union[str, Tuple[float, float], "WindowingNormalizer"]],
+    lower_limit: float = 0.0,
+    upper_limit: float = 1.0,
+    dtype: DTypeLike = np.float32,
+    value_range: Optional[Tuple[int, int]] = None,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Window and rescale an integer image, e.g. int16 CT, with one or more windows stacked as channels.
+
+    Each window is precomputed as a lookup table over all possible input values, so windowing, rescaling
+    and the output cast are a single gather (`np.take`) per voxel. All windows are applied in one pass over the image.
+    Value ranges of more than 2**16 values, e.g. of int32 images with outliers, are windowed arithmetically instead.
+
+    Parameters:
+        image (numpy.ndarray): The input image with an integer dtype.
+        windows (Sequence[Union[str, Tuple[float, float], WindowingNormalizer]]): The windows, as names of
+            `WINDOW_PRESETS` (e.g. "brain", "bone", "soft_tissue"), (center, width) tuples or WindowingNormalizers.
+        lower_limit (float): The output value at and below the lower window bound. Defaults to 0.
+        upper_limit (float): The output value at and above the upper window bound. Defaults to 1.
+        dtype (DTypeLike): The dtype of the result, e.g. np.float32 or np.uint8 (with limits 0 and 255);
+            integer results are rounded. Defaults to np.float32.
+        value_range (Tuple[int, int], optional): The minimum and maximum input value covered by the tables;
+            values outside are clamped. Defaults to the full range of 8 and 16 bit dtypes and to the observed
+            minimum and maximum of larger dtypes.
+        out (numpy.ndarray, optional): A preallocated C-contiguous array of shape (len(windows), *image.shape)
+            to write the result into.
+
+    Raises:
+        ValueError: If the image does not have an integer dtype, a window has zero width or `out` has the wrong shape.
+
+    Returns:
+        numpy.ndarray: The windowed images, stacked along the first axis.
+    """
+    image = np.asarray(image)
+    if image.dtype.kind not in "iu":
+        raise ValueError(
+            f"Lookup tables require an integer image, got dtype {image.dtype}."
+        )
+    windows = [
+        (
+            WINDOW_PRESETS[window]
+            if isinstance(window, str)
+            else (
+                (window.center, window.width)
+                if isinstance(window, WindowingNormalizer)
+                else tuple(window)
+            )
+        )
+        for window in windows
+    ]
+    if any(width == 0 for _, width in windows):
+        raise ValueError(f"Window widths must not be zero, got windows {windows}.")
+
+    shape = (len(windows),) + image.shape
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape or not out.flags.c_contiguous:
+        raise ValueError(
+            f"Output must be a C-contiguous array of shape {shape}, got {out.shape}."
+        )
+    dtype = out.dtype
+    if image.size == 0:
+        # nothing to look up, and without observed values a table would span the whole dtype
+        return out
+
+    if value_range is None and image.dtype.itemsize > 2:
+        value_range = (int(image.min()), int(image.max()))
+    elif value_range is not None:
+        value_range = (int(value_range[0]), int(value_range[1]))
+
+    if value_range is not None and value_range[1] - value_range[0] >= _MAX_TABLE_SIZE:
+        # clamping to the value range first keeps the result identical to that of a table
+        clamp = ElementwiseTransform(lower=value_range[0], upper=value_range[1])
+        for (center, width), channel in zip(windows, out):
+            clamp.then(
+                _window_transform(center, width, lower_limit, upper_limit)
+            ).apply(image, dtype=dtype, out=channel)
+        return out
+
+    tables = [
+        _lookup_table(
+            float(center),
+            float(width),
+            float(lower_limit),
+            float(upper_limit),
+            image.dtype.str,
+            dtype.str,
+            value_range,
+        )
+        for center, width in windows
+    ]
+
+    flat_image = image.reshape(-1)
+    flat_out = out.reshape(len(windows), -1)
+    for start in range(0, flat_image.size, _LOOKUP_BLOCK_SIZE):
+        block = flat_image[start : start + _LOOKUP_BLOCK_SIZE]
+        if value_range is None:
+            indices = block.view(f"u{block.dtype.itemsize}")
+        else:
+            indices = np.subtract(block, value_range[0], dtype=np.intp)
+        # the indices of a block are reused for all windows while they are in the cache;
+        # mode "clip" skips bounds checking and clamps values outside the value range
+        for table, channel in zip(tables, flat_out):
+            np.take(
+                table, indices, out=channel[start : start + block.size], mode="clip"
+            )
+    return out
 
 
 class WindowingNormalizer(Normalizer):
@@ -19,17 +194,91 @@ class WindowingNormalizer(Normalizer):
         self.center = center
         self.width = width
 
-    def normalize(self, image):
+    @instrument(array="image")
+    def normalize(
+        self,
+        image,
+        dtype: Optional[DTypeLike] = None,
+        out: Optional[np.ndarray] = None,
+    ):
         """
         Normalize the input image using windowing.
 
         Parameters:
             image (numpy.ndarray): The input image.
+            dtype (DTypeLike, optional): The dtype of the result, e.g. np.float32; integer results are rounded.
+                Defaults to the dtype of `out`, or the dtype NumPy chooses for clipping the image.
+            out (numpy.ndarray, optional): A preallocated array with the shape of the image to write the result into.
 
         Returns:
             numpy.ndarray: The windowed normalized image.
         """
+        if dtype is not None or out is not None:
+            return self.elementwise_transform(image).apply(image, dtype=dtype, out=out)
         min_value = self.center - self.width / 2
         max_value = self.center + self.width / 2
         windowed_image = np.clip(image, min_value, max_value)
         return windowed_image
+
+    @instrument(array="image")
+    def normalize_lut(
+        self,
+        image: np.ndarray,
+        lower_limit: float = 0.0,
+        upper_limit: float = 1.0,
+        dtype: DTypeLike = np.float32,
+        value_range: Optional[Tuple[int, int]] = None,
+        out: Optional[np.ndarray] = None,
+    ):
+        """
+        Window an integer image and rescale the window to [lower_limit, upper_limit] with a precomputed lookup table,
+        in a single pass over memory. See `apply_windows` for several windows at once.
+
+        Parameters:
+            image (numpy.ndarray): The input image with an integer dtype, e.g. int16 CT.
+            lower_limit (float): The output value at and below the lower window bound. Defaults to 0.
+            upper_limit (float): The output value at and above the upper window bound. Defaults to 1.
+            dtype (DTypeLike): The dtype of the result, e.g. np.float32 or np.uint8 (with limits 0 and 255).
+                Defaults to np.float32.
+            value_range (Tuple[int, int], optional): The minimum and maximum input value covered by the table,
+                see `apply_windows`.
+            out (numpy.ndarray, optional): A preallocated C-contiguous array with the shape of the image.
+
+        Returns:
+            numpy.ndarray: The windowed and rescaled image.
+        """
+        return apply_windows(
+            image,
+            [self],
+            lower_limit=lower_limit,
+            upper_limit=upper_limit,
+            dtype=dtype,
+            value_range=value_range,
+            out=out[np.newaxis] if out is not None else None,
+        )[0]
+
+    def elementwise_transform(
+        self,
+        image: np.ndarray,
+        prior: ElementwiseTransform = ElementwiseTransform(),
+        fitted: bool = False,
+    ) -> ElementwiseTransform:
+        """
+        Express the windowing as an element-wise transform, see `Normalizer.elementwise_transform`.
+        """
+        return ElementwiseTransform(
+            lower=self.center - self.width / 2, upper=self.center + self.width / 2
+        )
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        """
+        Return the window parameters as a dictionary of NumPy arrays.
+        """
+        return {"center": np.asarray(self.center), "width": np.asarray(self.width)}
+
+    def load_state_dict(self, state: Dict[str, np.ndarray]) -> None:
+        """
+        Restore the window parameters from a dictionary created by `state_dict`.
+        """
+        self.center = float(state["center"])
+        self.width = float(state["width"])
@@ -1,10 +1,13 @@
 import datetime
 import os
 import platform
+import queue
+import signal
 import subprocess
+import threading
 import time
 
-from typing import List, Optional, Tuple
+from typing import IO, List, Optional, Tuple
 
 
 class ScriptRunner:
@@ -16,7 +19,7 @@ class ScriptRunner:
         log_path (str): Path to the log file where the script output will be saved.
 
     Methods:
-        run(input_params: Optional[List[str]] = None) -> Tuple[bool, str]:
+        run(input_params: Optional[List[str]] = None, timeout: Optional[float] = None) -> Tuple[bool, str]:
         Execute the script and capture the output in the log file.
 
         Returns:
@@ -38,16 +41,64 @@ class ScriptRunner:
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_file.write(f"[{timestamp}] {stream}: {line}")
 
+    @staticmethod
+    def _enqueue_stream(
+        stream_name: str,
+        stream: IO[str],
+        line_queue: queue.Queue,
+        discard: threading.Event,
+    ) -> None:
+        # Drain a pipe line by line as data arrives; None marks the end of the stream.
+        # Once `discard` is set the queue is no longer consumed, so lines are dropped instead of blocking on it.
+        for line in iter(stream.readline, ""):
+            if not discard.is_set():
+                line_queue.put((stream_name, line))
+        stream.close()
+        line_queue.put((stream_name, None))
+
+    @staticmethod
+    def _kill_process_group(process: subprocess.Popen) -> None:
+        # Kill the script together with all processes it started, which would otherwise keep running
+        # and hold the pipes open.
+        if platform.system() == "Windows":
+            subprocess.run(
+                ["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        else:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        process.kill()
+
+    def _drain_queue(self, line_queue: queue.Queue, log_file: object) -> None:
+        # Log the lines already queued without waiting for more; unblocks readers waiting on a full queue.
+        while True:
+            try:
+                stream_name, line = line_queue.get_nowait()
+            except queue.Empty:
+                return
+            if line is not None:
+                self._write_log_line(stream_name, line, log_file)
+
     def run(
         self,
         input_params: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
     ) -> Tuple[bool, str]:
         """
         Execute the script and capture the output in the log file.
 
+        Both output streams are drained concurrently by reader threads, so a script that is chatty on one
+        stream and quiet on the other, or one that fills a pipe buffer, cannot stall or deadlock the run.
+
         Args:
             input_params (list, optional): List of input parameters to be passed to the script.
                 Defaults to None.
+            timeout (float, optional): Wall-clock timeout in seconds after which the script is killed.
+                Defaults to None (no timeout).
 
         Returns:
             Tuple[bool, str]: A tuple containing a boolean (True if script executed successfully, False otherwise)
@@ -64,37 +115,85 @@ class ScriptRunner:
                 if input_params:
                     log_file.write(f"Input Parameters: {input_params}\n")
 
+                command = [self.platform_command, self.script_path] + (
+                    input_params or []
+                )
+                # the script gets its own process group, so that a timeout also kills the processes it started
+                if platform.system() == "Windows":
+                    group_options = {
+                        "creationflags": subprocess.CREATE_NEW_PROCESS_GROUP
+                    }
+                else:
+                    group_options = {"start_new_session": True}
                 process = subprocess.Popen(
-                    [self.platform_command, self.script_path] + input_params,
+                    command,
                     stdout=subprocess.PIPE,
                     stderr=subprocess.PIPE,
                     text=True,
+                    **group_options,
                 )
 
-                while process.poll() is None:
-                    stdout_line = process.stdout.readline()
-                    stderr_line = process.stderr.readline()
-                    if stdout_line:
-                        self._write_log_line("stdout", stdout_line, log_file)
-                    if stderr_line:
-                        self._write_log_line("stderr", stderr_line, log_file)
-
-                for stdout_line in process.stdout.readlines():
-                    self._write_log_line("stdout", stdout_line, log_file)
-                for stderr_line in process.stderr.readlines():
-                    self._write_log_line("stderr", stderr_line, log_file)
+                # bounded queue keeps memory constant; readers block until lines are logged
+                line_queue = queue.Queue(maxsize=1024)
+                discard = threading.Event()
+                for stream_name, stream in (
+                    ("stdout", process.stdout),
+                    ("stderr", process.stderr),
+                ):
+                    threading.Thread(
+                        target=self._enqueue_stream,
+                        args=(stream_name, stream, line_queue, discard),
+                        daemon=True,
+                    ).start()
+
+                deadline = None if timeout is None else start_time + timeout
+                try:
+                    open_streams = 2
+                    while open_streams:
+                        remaining = None if deadline is None else deadline - time.time()
+                        if remaining is not None and remaining <= 0:
+                            raise subprocess.TimeoutExpired(command, timeout)
+                        try:
+                            stream_name, line = line_queue.get(timeout=remaining)
+                        except queue.Empty:
+                            continue
+                        if line is None:
+                            open_streams -= 1
+                        else:
+                            self._write_log_line(stream_name, line, log_file)
+
+                    # the script may close its streams and keep running
+                    remaining = (
+                        None if deadline is None else max(deadline - time.time(), 0)
+                    )
+                    return_code = process.wait(timeout=remaining)
+                except subprocess.TimeoutExpired:
+                    self._kill_process_group(process)
+                    process.wait()
+                    # readers blocked on the full queue would otherwise hold the pipes open forever
+                    discard.set()
+                    self._drain_queue(line_queue, log_file)
+                    log_file.write(
+                        f"--- Killed {script_name} after {timeout} seconds ---\n"
+                    )
+                    raise subprocess.TimeoutExpired(command, timeout) from None
 
                 end_time = time.time()
                 total_duration = end_time - start_time
                 log_file.write(f"{'=' * 80}\n")
                 log_file.write(
-                    f"--- Finished {script_name} in {total_duration:.2f} seconds ---\n"
+                    f"--- Finished {script_name} in {total_duration:.2f} seconds with exit code {return_code} ---\n"
                 )
                 log_file.write(f"\n{'=' * 80}\n")
 
+                if return_code != 0:
+                    raise subprocess.CalledProcessError(return_code, command)
+
             return True, ""
         except subprocess.CalledProcessError as e:
             return False, f"Error executing script: {e}"
+        except subprocess.TimeoutExpired as e:
+            return False, f"Error executing script: {e}"
 
 
 if __name__ == "__main__":
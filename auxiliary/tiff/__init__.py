@@ -0,0 +1,3 @@
+from auxiliary._lazy import lazy_attributes
+
+__getattr__, __dir__, __all__ = lazy_attributes(__name__, submodules=["io"])
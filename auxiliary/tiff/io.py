@@ -1,42 +1,246 @@
+import math
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional, Tuple, Union
 
 import numpy as np
-from tifffile import imread, imwrite
+from numpy.typing import DTypeLike
 
+from auxiliary._lazy import LazyImport
+from auxiliary.instrumentation import instrument
 from auxiliary.turbopath import turbopath
 
+# tifffile is only imported on first use
+tifffile = LazyImport("tifffile")
 
-def read_tiff(tiff_path: str) -> np.ndarray:
+
+@instrument(read_path="tiff_path")
+def read_tiff(
+    tiff_path: str,
+    memory_map: bool = False,
+    maxworkers: Optional[int] = None,
+) -> np.ndarray:
     """
     Read a TIFF file and return its data as a NumPy array.
 
     Args:
         tiff_path (str): Path to the TIFF file to be read.
+        memory_map (bool): If True, return a read-only np.memmap of the image data instead of decoding it into memory.
+            Only supported for uncompressed TIFF files whose data are stored contiguously.
+        maxworkers (int, optional): Maximum number of threads used to decode tiles or strips. Defaults to tifffile's choice.
+
+    Raises:
+        ValueError: If `memory_map` is True and the image data are not memory-mappable.
 
     Returns:
         np.ndarray: Data from the TIFF file as a NumPy array.
     """
-    data = imread(tiff_path)
+    if memory_map:
+        return tifffile.memmap(tiff_path, mode="r")
+    data = tifffile.imread(tiff_path, maxworkers=maxworkers)
     return data
 
 
+def iter_tiff_pages(
+    tiff_path: str,
+    series: int = 0,
+    level: int = 0,
+) -> Iterator[np.ndarray]:
+    """
+    Lazily iterate over the pages of a TIFF series, decoding one page at a time.
+
+    Args:
+        tiff_path (str): Path to the TIFF file to be read.
+        series (int): Index of the image series. Defaults to 0.
+        level (int): Pyramid level of the series. Defaults to 0 (full resolution).
+
+    Yields:
+        np.ndarray: Data of each page as a NumPy array.
+    """
+    with tifffile.TiffFile(tiff_path) as tif:
+        for page in tif.series[series].levels[level].pages:
+            yield page.asarray()
+
+
+@instrument(read_result=True)
+def read_tiff_region(
+    tiff_path: str,
+    rows: slice,
+    columns: slice,
+    key: int = 0,
+    series: int = 0,
+    level: int = 0,
+    maxworkers: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Read a rectangular region of a TIFF page, decoding only the tiles or strips that overlap it.
+    Suited for whole-slide images and other large tiled TIFF files.
+
+    Args:
+        tiff_path (str): Path to the TIFF file to be read.
+        rows (slice): Rows of the region, e.g. `slice(1024, 2048)`.
+        columns (slice): Columns of the region.
+        key (int): Index of the page within the series. Defaults to 0.
+        series (int): Index of the image series. Defaults to 0.
+        level (int): Pyramid level of the series. Defaults to 0 (full resolution).
+        maxworkers (int, optional): Maximum number of threads used to decode tiles or strips. Defaults to the number of processors.
+
+    Raises:
+        ValueError: If the region is empty.
+
+    Returns:
+        np.ndarray: Data of the region as a NumPy array, with the same axes as the page.
+    """
+    with tifffile.TiffFile(tiff_path) as tif:
+        page = tif.series[series].levels[level].pages[key]
+        # pages after the first are usually TiffFrames, which only hold the offsets and byte counts
+        # of their data; the layout and decoder are those of their keyframe
+        keyframe = page.keyframe
+        samples, depth, length, width, contig_samples = keyframe.shaped
+        row_range = range(*rows.indices(length))
+        column_range = range(*columns.indices(width))
+        if len(row_range) == 0 or len(column_range) == 0:
+            raise ValueError(f"Region {rows}, {columns} of {tiff_path} is empty.")
+        row_start, row_stop = min(row_range), max(row_range) + 1
+        column_start, column_stop = min(column_range), max(column_range) + 1
+
+        if keyframe.is_tiled:
+            chunk_depth, chunk_length, chunk_width = (
+                keyframe.tiledepth,
+                keyframe.tilelength,
+                keyframe.tilewidth,
+            )
+        else:
+            chunk_depth, chunk_length, chunk_width = depth, keyframe.rowsperstrip, width
+        chunks_deep = math.ceil(depth / chunk_depth)
+        chunks_down = math.ceil(length / chunk_length)
+        chunks_across = math.ceil(width / chunk_width)
+
+        # linear indices of the tiles or strips overlapping the region
+        indices = [
+            ((sample * chunks_deep + d) * chunks_down + r) * chunks_across + c
+            for sample in range(samples)
+            for d in range(chunks_deep)
+            for r in range(
+                row_start // chunk_length, (row_stop - 1) // chunk_length + 1
+            )
+            for c in range(
+                column_start // chunk_width, (column_stop - 1) // chunk_width + 1
+            )
+        ]
+        segments = list(
+            tif.filehandle.read_segments(
+                [page.dataoffsets[i] for i in indices],
+                [page.databytecounts[i] for i in indices],
+                indices=indices,
+                lock=tif.filehandle.lock,
+            )
+        )
+
+        out = np.zeros(
+            (
+                samples,
+                depth,
+                row_stop - row_start,
+                column_stop - column_start,
+                contig_samples,
+            ),
+            dtype=keyframe.dtype,
+        )
+
+        def _decode_segment(segment) -> None:
+            data, position, _ = keyframe.decode(
+                *segment, jpegtables=keyframe.jpegtables, jpegheader=keyframe.jpegheader
+            )
+            if data is None:
+                return
+            sample, d, r, c, _ = position
+            top = max(row_start, r)
+            bottom = min(row_stop, r + data.shape[1])
+            left = max(column_start, c)
+            right = min(column_stop, c + data.shape[2])
+            out[
+                sample,
+                d : d + data.shape[0],
+                top - row_start : bottom - row_start,
+                left - column_start : right - column_start,
+            ] = data[:, top - r : bottom - r, left - c : right - c]
+
+        with ThreadPoolExecutor(max_workers=maxworkers) as executor:
+            list(executor.map(_decode_segment, segments))
+
+    out = out[:, :, :: row_range.step, :: column_range.step]
+    # drop the singleton axes that tifffile also drops from the page shape
+    shape = tuple(
+        n
+        for n, keep in zip(
+            out.shape, (samples > 1, depth > 1, True, True, contig_samples > 1)
+        )
+        if keep
+    )
+    return out.reshape(shape)
+
+
+def _iter_tiles(
+    pages: Iterable[np.ndarray], tile: Tuple[int, int]
+) -> Iterator[np.ndarray]:
+    """
+    Split each page into tiles in row-major order, as expected by tifffile for tiled iterator writes.
+    """
+    tile_length, tile_width = tile
+    for page in pages:
+        for row in range(0, page.shape[0], tile_length):
+            for column in range(0, page.shape[1], tile_width):
+                yield page[row : row + tile_length, column : column + tile_width]
+
+
+@instrument(write_path="output_tiff_path", array="numpy_array")
 def write_tiff(
-    numpy_array: np.ndarray,
+    numpy_array: Union[np.ndarray, Iterable[np.ndarray]],
     output_tiff_path: str,
     create_parent_directory: bool = False,
     transpose: bool = False,
+    tile: Optional[Tuple[int, int]] = None,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    maxworkers: Optional[int] = None,
+    pyramid_levels: int = 0,
+    shape: Optional[Tuple[int, ...]] = None,
+    dtype: Optional[DTypeLike] = None,
 ) -> None:
     """
     Write a NumPy array to a TIFF file.
 
     Args:
-        numpy_array (np.ndarray): NumPy array containing the data to be written.
+        numpy_array (np.ndarray or Iterable[np.ndarray]): NumPy array containing the data to be written,
+            or an iterable yielding one page at a time, which requires `shape` and `dtype`.
+            Pages from an iterable are written as they are produced, so the full array never has to be in memory.
         output_tiff_path (str): Path to the output TIFF file.
         create_parent_directory (bool): Whether to create the parent directory if it doesn't exist.
         transpose (bool): Whether to transpose the input array before writing.
+        tile (Tuple[int, int], optional): Tile length and width, e.g. (256, 256), both multiples of 16. Defaults to strips.
+        compression (str, optional): Compression codec, e.g. "zlib", "zstd" or "lzw". Codecs other than "zlib" and "lzma"
+            require the optional imagecodecs package. Defaults to no compression.
+        compression_level (int, optional): Compression level of the codec. Defaults to the codec's default.
+        maxworkers (int, optional): Maximum number of threads used to encode tiles or strips. Defaults to tifffile's choice.
+        pyramid_levels (int): Number of downsampled pyramid levels written as SubIFDs, each half the size of the previous one.
+            Rows and columns are the last two axes, or the two before a trailing RGB(A) axis of size 3 or 4.
+            Only supported for arrays. Defaults to 0.
+        shape (Tuple[int, ...], optional): Shape of the data, required if `numpy_array` is an iterable.
+        dtype (DTypeLike, optional): Dtype of the data, required if `numpy_array` is an iterable.
+
+    Raises:
+        ValueError: If `numpy_array` is an iterable and `shape` or `dtype` is missing, or pyramid levels are requested.
     """
-    if transpose:
-        numpy_array = numpy_array.T
+    is_array = isinstance(numpy_array, np.ndarray)
+    if is_array:
+        if transpose:
+            numpy_array = numpy_array.T
+        shape, dtype = numpy_array.shape, numpy_array.dtype
+    elif shape is None or dtype is None or transpose or pyramid_levels:
+        raise ValueError(
+            "Writing pages from an iterable requires shape and dtype, and does not support transpose or pyramid levels."
+        )
 
     if create_parent_directory:
         output_tiff_path = turbopath(
@@ -45,5 +249,39 @@ def write_tiff(
         parent_dir = output_tiff_path.parent
         os.makedirs(parent_dir, exist_ok=True)
 
+    options = dict(
+        tile=tile,
+        compression=compression,
+        compressionargs=(
+            {"level": compression_level} if compression_level is not None else None
+        ),
+        maxworkers=maxworkers,
+    )
+    # classic TIFF files are limited to 4 GB, leave some room for metadata
+    bigtiff = (
+        int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize > 2**32 - 2**25
+    )
+
     # Write the NumPy array to the specified TIFF file
-    imwrite(output_tiff_path, numpy_array)
+    with tifffile.TiffWriter(output_tiff_path, bigtiff=bigtiff) as tif:
+        tif.write(
+            (
+                numpy_array
+                if is_array or tile is None
+                else _iter_tiles(numpy_array, tile)
+            ),
+            shape=None if is_array else shape,
+            dtype=None if is_array else dtype,
+            subifds=pyramid_levels or None,
+            **options,
+        )
+
+        level = numpy_array
+        if pyramid_levels:
+            yx_axes = 2 if shape[-1] in (3, 4) and len(shape) > 2 else 1
+            downsample = (Ellipsis, slice(None, None, 2), slice(None, None, 2)) + (
+                slice(None),
+            ) * (yx_axes - 1)
+        for _ in range(pyramid_levels):
+            level = level[downsample]
+            tif.write(level, subfiletype=1, **options)
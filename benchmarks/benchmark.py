@@ -0,0 +1,328 @@
+"""
+Reproducible benchmarks for the io, tiff, conversion and normalization hot paths of auxiliary.
+
+Run with auxiliary installed (e.g. `pip install -e .`). Every case runs on synthetic data generated locally, once in a
+fresh process for the timings and once in another fresh, untimed process for the memory, so that peak RSS is measured
+in isolation and tracing does not skew the timings.
+Results are written as JSON and can be compared between versions:
+
+    python benchmarks/benchmark.py --output before.json
+    python benchmarks/benchmark.py --output after.json
+    python benchmarks/benchmark.py --compare before.json after.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SIZES = {
+    "small": (64, 64, 64),
+    "medium": (128, 256, 256),
+    "large": (256, 512, 512),
+}
+DTYPES = ("int16", "float32")
+
+
+def _synthetic_volume(shape, dtype: str) -> np.ndarray:
+    # smooth intensities plus noise, so that compression ratios resemble real scans
+    rng = np.random.default_rng(0)
+    z, y, x = np.meshgrid(*(np.linspace(-1, 1, n) for n in shape), indexing="ij")
+    volume = 1000 * np.exp(-(x**2 + y**2 + z**2) * 2) + rng.normal(0, 20, shape)
+    return volume.astype(dtype)
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+# Each case prepares its inputs in a temporary directory and returns a callable that runs the benchmarked operation.
+def _case_write_image(tmp: Path, volume: np.ndarray) -> Callable[[], None]:
+    from auxiliary.io import write_image
+
+    return lambda: write_image(volume, str(tmp / "out.nii.gz"))
+
+
+def _case_read_image(tmp: Path, volume: np.ndarray) -> Callable[[], None]:
+    from auxiliary.io import read_image, write_image
+
+    write_image(volume, str(tmp / "in.nii.gz"))
+    return lambda: read_image(str(tmp / "in.nii.gz"))
+
+
+def _case_write_tiff(tmp: Path, volume: np.ndarray) -> Callable[[], None]:
+    from auxiliary.tiff.io import write_tiff
+
+    return lambda: write_tiff(volume, str(tmp / "out.tif"))
+
+
+def _case_read_tiff(tmp: Path, volume: np.ndarray) -> Callable[[], None]:
+    from auxiliary.tiff.io import read_tiff, write_tiff
+
+    write_tiff(volume, str(tmp / "in.tif"))
+    return lambda: read_tiff(str(tmp / "in.tif"))
+
+
+def _case_percentile_normalizer(tmp: Path, volume: np.ndarray) -> Callable[[], None]:
+    from auxiliary.normalization.percentile_normalizer import PercentileNormalizer
+
+    normalizer = PercentileNormalizer(lower_percentile=0.5, upper_percentile=99.5)
+    return lambda: normalizer.normalize(volume)
+
+
+def _case_windowing_normalizer(tmp: Path, volume: np.ndarray) -> Callable[[], None]:
+    from auxiliary.normalization.windowing_normalizer import WindowingNormalizer
+
+    normalizer = WindowingNormalizer(center=40, width=400)
+    return lambda: normalizer.normalize(volume)
+
+
+def _case_nifti_to_dicom(tmp: Path, volume: np.ndarray) -> Callable[[], None]:
+    from auxiliary.conversion import nifti_to_dicom_itk
+
+    return lambda: nifti_to_dicom_itk(volume, tmp / "dicom_out")
+
+
+def _case_dicom_to_nifti(tmp: Path, volume: np.ndarray) -> Callable[[], None]:
+    from auxiliary.conversion import dicom_to_nifti_itk, nifti_to_dicom_itk
+
+    nifti_to_dicom_itk(volume, tmp / "dicom_in")
+    return lambda: dicom_to_nifti_itk(tmp / "dicom_in", tmp / "nifti_out")
+
+
+CASES = {
+    "io.write_image": _case_write_image,
+    "io.read_image": _case_read_image,
+    "tiff.write_tiff": _case_write_tiff,
+    "tiff.read_tiff": _case_read_tiff,
+    "normalization.percentile": _case_percentile_normalizer,
+    "normalization.windowing": _case_windowing_normalizer,
+    "conversion.nifti_to_dicom_itk": _case_nifti_to_dicom,
+    "conversion.dicom_to_nifti_itk": _case_dicom_to_nifti,
+}
+
+# DICOM pixel data are integers; the conversion cases only run for these dtypes
+CASE_DTYPES = {
+    "conversion.nifti_to_dicom_itk": ("int16",),
+    "conversion.dicom_to_nifti_itk": ("int16",),
+}
+
+
+def time_case(case: str, size: str, dtype: str, repeat: int) -> Dict:
+    """
+    Time a single benchmark case; meant to be executed in a fresh process.
+
+    Args:
+        case (str): Name of the case, a key of CASES.
+        size (str): Name of the volume size, a key of SIZES.
+        dtype (str): NumPy dtype of the synthetic volume.
+        repeat (int): Number of timed repetitions after one warm-up run.
+
+    Returns:
+        Dict: The timings of the case.
+    """
+    volume = _synthetic_volume(SIZES[size], dtype)
+    with tempfile.TemporaryDirectory() as tmp:
+        run = CASES[case](Path(tmp), volume)
+        run()  # warm-up, e.g. imports and file system caches
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+
+    median = statistics.median(timings)
+    return {
+        "case": case,
+        "size": size,
+        "shape": list(volume.shape),
+        "dtype": dtype,
+        "repeat": repeat,
+        "median_s": median,
+        "min_s": min(timings),
+        "max_s": max(timings),
+        "throughput_mb_s": volume.nbytes / 2**20 / median,
+    }
+
+
+def _reset_peak_rss() -> bool:
+    # Linux only: writing 5 to clear_refs resets the high-water mark of the resident set, i.e. ru_maxrss
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def measure_case_memory(case: str, size: str, dtype: str) -> Dict:
+    """
+    Measure the memory of a single, untimed run of a benchmark case; meant to be executed in a fresh process.
+
+    There is no warm-up run, whose peak would hide the peak of the measured run. The backends are imported and
+    the inputs prepared before measuring, so neither counts towards the peak.
+
+    Args:
+        case (str): Name of the case, a key of CASES.
+        size (str): Name of the volume size, a key of SIZES.
+        dtype (str): NumPy dtype of the synthetic volume.
+
+    Returns:
+        Dict: The peak memory traced by tracemalloc (NumPy and Python allocations, not SimpleITK buffers),
+            the peak RSS of the process and, on Linux, the increase of the peak RSS during the run.
+    """
+    import SimpleITK  # noqa: F401
+    import tifffile  # noqa: F401
+
+    volume = _synthetic_volume(SIZES[size], dtype)
+    with tempfile.TemporaryDirectory() as tmp:
+        run = CASES[case](Path(tmp), volume)
+        # without a reset, the peak of the setup, e.g. generating the volume, may exceed the peak of the run
+        baseline_rss = _peak_rss_mb() if _reset_peak_rss() else None
+
+        tracemalloc.start()
+        run()
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_rss = _peak_rss_mb()
+
+    return {
+        "peak_traced_mb": peak_traced / 2**20,
+        "peak_rss_mb": peak_rss,
+        "peak_rss_increase_mb": (
+            None
+            if peak_rss is None or baseline_rss is None
+            else max(peak_rss - baseline_rss, 0.0)
+        ),
+    }
+
+
+def _environment() -> Dict:
+    import SimpleITK as sitk
+    import tifffile
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "numpy": np.__version__,
+        "simpleitk": sitk.Version_VersionString(),
+        "tifffile": tifffile.__version__,
+    }
+
+
+def run_benchmarks(
+    cases: List[str], sizes: List[str], dtypes: List[str], repeat: int
+) -> Dict:
+    """
+    Run all combinations of cases, sizes and dtypes, each in a fresh process.
+
+    Returns:
+        Dict: The environment and the list of measurements.
+    """
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for case in cases:
+        for size in sizes:
+            for dtype in dtypes:
+                if dtype not in CASE_DTYPES.get(case, DTYPES):
+                    continue
+                # timing and memory are measured in separate fresh processes, as tracing slows down allocations
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    result = pool.submit(time_case, case, size, dtype, repeat).result()
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    result.update(
+                        pool.submit(measure_case_memory, case, size, dtype).result()
+                    )
+                print(
+                    f"{case:32s} {size:7s} {dtype:8s} "
+                    f"{result['median_s'] * 1000:10.1f} ms {result['throughput_mb_s']:10.1f} MB/s "
+                    f"peak +{result['peak_traced_mb']:.1f} MB traced"
+                    + (
+                        f", +{result['peak_rss_increase_mb']:.1f} MB RSS"
+                        if result["peak_rss_increase_mb"] is not None
+                        else ""
+                    )
+                )
+                results.append(result)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": _environment(),
+        "results": results,
+    }
+
+
+def compare(baseline_path: str, candidate_path: str) -> None:
+    """
+    Print the change in median time and peak allocation between two result files.
+    """
+    with open(baseline_path) as f:
+        baseline = {
+            (r["case"], r["size"], r["dtype"]): r for r in json.load(f)["results"]
+        }
+    with open(candidate_path) as f:
+        candidate = json.load(f)["results"]
+
+    print(f"{'case':32s} {'size':7s} {'dtype':8s} {'time':>10s} {'peak mem':>10s}")
+    for result in candidate:
+        before = baseline.get((result["case"], result["size"], result["dtype"]))
+        if before is None:
+            continue
+        time_ratio = result["median_s"] / before["median_s"]
+        memory_ratio = result["peak_traced_mb"] / max(before["peak_traced_mb"], 1e-9)
+        print(
+            f"{result['case']:32s} {result['size']:7s} {result['dtype']:8s} "
+            f"{time_ratio:9.2f}x {memory_ratio:9.2f}x"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument(
+        "--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"]
+    )
+    parser.add_argument("--dtypes", nargs="+", choices=DTYPES, default=list(DTYPES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Path of the JSON results file.")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASELINE", "CANDIDATE"),
+        help="Compare two result files instead of running benchmarks.",
+    )
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run_benchmarks(args.cases, args.sizes, args.dtypes, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import numpy as np
+import SimpleITK as sitk
+
+from auxiliary.conversion import nifti_to_dicom_itk
+
+
+def test_multi_frame_round_trip_without_reference(tmp_path):
+    array = (np.arange(4 * 5 * 6).reshape(4, 5, 6) - 50).astype(np.int16)
+    image = sitk.GetImageFromArray(array)
+    image.SetSpacing((0.5, 0.75, 2.0))
+    image.SetOrigin((1.0, 2.0, 3.0))
+
+    nifti_to_dicom_itk(image, tmp_path, multi_frame=True)
+
+    volume = sitk.ReadImage(str(tmp_path / "volume.dcm"))
+    np.testing.assert_array_equal(sitk.GetArrayFromImage(volume), array)
+    np.testing.assert_allclose(volume.GetSpacing(), image.GetSpacing())
+    np.testing.assert_allclose(volume.GetOrigin(), image.GetOrigin())
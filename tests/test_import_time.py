@@ -0,0 +1,53 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+# importing any module must not load the heavy backends, which are only needed on first use
+HEAVY_MODULES = ("SimpleITK", "tifffile", "loguru")
+# generous enough for slow CI machines, the measured time includes importing NumPy
+IMPORT_TIME_BUDGET = 2.0
+
+MODULES = [
+    "auxiliary",
+    "auxiliary.aio",
+    "auxiliary.batch_conversion",
+    "auxiliary.conversion",
+    "auxiliary.dicom_index",
+    "auxiliary.instrumentation",
+    "auxiliary.io",
+    "auxiliary.loader",
+    "auxiliary.nifti.io",
+    "auxiliary.normalization",
+    "auxiliary.normalization.percentile_normalizer",
+    "auxiliary.normalization.pipeline",
+    "auxiliary.normalization.windowing_normalizer",
+    "auxiliary.runscript",
+    "auxiliary.tiff.io",
+    "auxiliary.turbopath",
+]
+
+_SCRIPT = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+duration = time.perf_counter() - start
+print(json.dumps({"duration": duration, "modules": sorted(sys.modules)}))
+"""
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_is_lazy_and_fast(module):
+    # a fresh interpreter, so that no module is cached from other tests
+    completed = subprocess.run(
+        [sys.executable, "-c", _SCRIPT, module],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(completed.stdout)
+
+    loaded = [name for name in HEAVY_MODULES if name in result["modules"]]
+    assert not loaded, f"import {module} loaded {loaded}"
+    assert result["duration"] < IMPORT_TIME_BUDGET
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+import tifffile
+
+from auxiliary.tiff.io import read_tiff_region
+
+
+@pytest.mark.parametrize("tile", [None, (16, 16)])
+def test_read_tiff_region_of_later_page(tmp_path, tile):
+    data = np.random.default_rng(0).integers(0, 2**16, (3, 40, 50), dtype=np.uint16)
+    tiff_path = tmp_path / "stack.tif"
+    tifffile.imwrite(
+        tiff_path, data, photometric="minisblack", tile=tile, rowsperstrip=8
+    )
+
+    for key in range(len(data)):
+        region = read_tiff_region(
+            str(tiff_path), slice(5, 37), slice(10, 49, 3), key=key
+        )
+        np.testing.assert_array_equal(region, data[key, 5:37, 10:49:3])